@@ -8,6 +8,7 @@ import signal
 import sys
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import BotCommand, BotCommandScopeDefault, Message, MenuButtonCommands, CallbackQuery
@@ -34,10 +35,13 @@ from handlers.start import start_router
 
 # Import bazy danych i schedulera
 from database.connection import db_manager
+from database.models import GlobalBlacklist, InboxMuted
 from utils.scheduler import BotScheduler
 from handlers.admin_bans import admin_bans_router
 from handlers.admin_edit import admin_edit_router
-from handlers.sfs import run_update_sfs_members_count
+from handlers.sfs import run_update_sfs_members_count, start_rate_flusher, stop_rate_flusher
+from utils.write_queue import start_write_flusher, stop_write_flusher
+from utils.channel_stats import close_client as close_channel_stats_client
 from handlers.superadmin import superadmin_router
 from handlers.inbox import inbox_router
 logger = logging.getLogger(__name__)
@@ -48,8 +52,10 @@ class PremiumBot:
     
     def __init__(self):
         # Inicjalizacja bota z domyślnymi właściwościami
+        # Jedna pula połączeń (keep-alive aiohttp) o rozmiarze HTTP_POOL_LIMIT – broadcast nie czeka na wolne gniazdo
         self.bot = Bot(
             token=settings.BOT_TOKEN,
+            session=AiohttpSession(limit=settings.HTTP_POOL_LIMIT),
             default=DefaultBotProperties(
                 parse_mode=ParseMode.MARKDOWN
             )
@@ -266,6 +272,12 @@ class PremiumBot:
             # Inicjalizacja bazy danych
             await db_manager.init_tables()
             logger.info("Baza danych zainicjalizowana")
+
+            # Czarna lista w pamięci – sprawdzanie bana w middleware bez zapytania do bazy
+            banned_count = await GlobalBlacklist.load_cache()
+            logger.info("Czarna lista wczytana do pamięci: %s wpisów", banned_count)
+            muted_count = await InboxMuted.load_cache()
+            logger.info("Wyciszeni (inbox) wczytani do pamięci: %s wpisów", muted_count)
             
             # Bufor logów dla konsolki super-admina
             from utils.log_buffer import setup_buffer_handler
@@ -282,6 +294,11 @@ class PremiumBot:
 
             # Uruchomienie schedulera (przekazanie pętli, żeby async joby się wykonywały)
             await self.scheduler.start(loop=asyncio.get_running_loop())
+
+            # Zapis łapek SFS paczkami w tle
+            start_rate_flusher()
+            # Zapis użytkowników / logów interakcji z middleware paczkami w tle
+            start_write_flusher()
             
             # Powiadomienie admina o starcie
             try:
@@ -315,6 +332,12 @@ class PremiumBot:
             
             # Zatrzymanie schedulera
             await self.scheduler.stop()
+
+            # Zapis łapek SFS, które czekają jeszcze w pamięci
+            await stop_rate_flusher()
+            await stop_write_flusher()
+            # Socket i sesja Telethon (średnia wyświetleń), jeśli klient był połączony
+            await close_channel_stats_client()
             
             # Zamknięcie połączenia z bazą danych
             await db_manager.disconnect()
@@ -365,8 +388,34 @@ async def main():
             logger.error(f"Błąd przy zatrzymywaniu bota: {e}")
 
 
+def _install_event_loop() -> None:
+    """
+    Wybór pętli zdarzeń wg settings.EVENT_LOOP. rloop (Rust, eksperymentalna) tylko na Linuksie i gdy zainstalowana;
+    w przeciwnym razie uvloop, a bez niego (np. Windows) domyślny asyncio.
+    """
+    choice = (settings.EVENT_LOOP or "uvloop").lower()
+    if choice == "asyncio":
+        return
+    if choice == "rloop" and sys.platform == "linux":
+        try:
+            import rloop
+        except ImportError:
+            logger.warning("EVENT_LOOP=rloop, ale pakiet rloop nie jest zainstalowany – próbuję uvloop")
+        else:
+            asyncio.set_event_loop_policy(rloop.EventLoopPolicy())
+            logger.info("Pętla zdarzeń: rloop")
+            return
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    logger.info("Pętla zdarzeń: uvloop")
+
+
 if __name__ == "__main__":
     """Entry point"""
+    _install_event_loop()
     try:
         # Uruchomienie głównej funkcji async
         asyncio.run(main())
@@ -2,6 +2,7 @@
 Konfiguracja bota - ładowanie zmiennych środowiskowych z walidacją
 """
 import logging
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 from urllib.parse import urlparse
@@ -9,6 +10,15 @@ from pydantic import model_validator, validator
 from pydantic_settings import BaseSettings
 
 
+@lru_cache(maxsize=8)
+def _parse_superadmin_ids(raw: str) -> frozenset:
+    """SUPERADMIN_IDS ("1,2,3") -> frozenset; cache po surowym stringu, więc zmiana wartości daje nowy wynik."""
+    try:
+        return frozenset(int(x.strip()) for x in raw.split(",") if x.strip())
+    except (ValueError, AttributeError):
+        return frozenset()
+
+
 class Settings(BaseSettings):
     """Ustawienia bota z walidacją Pydantic"""
     
@@ -40,6 +50,12 @@ class Settings(BaseSettings):
     
     # Scheduler
     SCHEDULER_INTERVAL_HOURS: int = 1
+
+    # Pętla zdarzeń: "uvloop" (domyślnie), "rloop" (eksperymentalna, tylko Linux) lub "asyncio"
+    EVENT_LOOP: str = "uvloop"
+
+    # Pula połączeń HTTP do Bot API (keep-alive); broadcast nie wysyła więcej równolegle
+    HTTP_POOL_LIMIT: int = 64
     
     class Config:
         env_file = ".env"
@@ -87,14 +103,14 @@ class Settings(BaseSettings):
         """Lista dodatkowych ID superadminów (z env SUPERADMIN_IDS)."""
         if not getattr(self, "SUPERADMIN_IDS", None):
             return []
-        try:
-            return [int(x.strip()) for x in self.SUPERADMIN_IDS.split(",") if x.strip()]
-        except (ValueError, AttributeError):
-            return []
+        return list(_parse_superadmin_ids(self.SUPERADMIN_IDS))
 
     def is_superadmin(self, user_id: int) -> bool:
-        """Czy user_id to główny admin lub jeden z SUPERADMIN_IDS."""
-        return user_id == self.ADMIN_ID or user_id in self.superadmin_ids
+        """Czy user_id to główny admin lub jeden z SUPERADMIN_IDS (zbiór parsowany raz, nie przy każdym update)."""
+        if user_id == self.ADMIN_ID:
+            return True
+        raw = self.SUPERADMIN_IDS
+        return bool(raw) and user_id in _parse_superadmin_ids(raw)
     
     @validator("LOG_LEVEL")
     def validate_log_level(cls, v):
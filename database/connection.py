@@ -265,6 +265,10 @@ if USE_POSTGRES:
                     )
                 """)
                     await c.execute("CREATE INDEX IF NOT EXISTS idx_interaction_logs_user_created ON user_interaction_logs (user_id, created_at DESC)")
+                    # Stary indeks bez owner_id zastąpiony idx_sfs_listings_page (pełny klucz sortowania listy SFS)
+                    await c.execute("DROP INDEX IF EXISTS idx_sfs_listings_order")
+                    await c.execute("CREATE INDEX IF NOT EXISTS idx_sfs_listings_page ON sfs_listings (refreshed_at DESC, created_at DESC, owner_id DESC)")
+                    await c.execute("CREATE INDEX IF NOT EXISTS idx_channels_owner_type ON channels (owner_id, type)")
                     logger.info("Tabele PostgreSQL (Supabase) zainicjalizowane")
                     await self._migrate_bot_settings_user_id(c)
                     await self._migrate_scheduled_posts_owner_id(c)
@@ -376,6 +380,12 @@ else:
                 self._connection = await aiosqlite.connect(self.db_path)
                 self._connection.row_factory = aiosqlite.Row
                 await self._connection.execute("PRAGMA foreign_keys = ON")
+                # WAL: odczyty nie blokują się z zapisem; synchronous=NORMAL wystarcza przy WAL.
+                # cache_size ujemny = KiB (64 MB), mmap do 256 MB
+                await self._connection.execute("PRAGMA journal_mode = WAL")
+                await self._connection.execute("PRAGMA synchronous = NORMAL")
+                await self._connection.execute("PRAGMA cache_size = -64000")
+                await self._connection.execute("PRAGMA mmap_size = 268435456")
                 await self._connection.commit()
                 logger.info(f"Połączono z bazą danych SQLite: {self.db_path}")
                 return self._connection
@@ -512,6 +522,10 @@ else:
                     )
                 """)
                 await connection.execute("CREATE INDEX IF NOT EXISTS idx_interaction_logs_user_created ON user_interaction_logs (user_id, created_at DESC)")
+                # Stary indeks bez owner_id zastąpiony idx_sfs_listings_page (pełny klucz sortowania listy SFS)
+                await connection.execute("DROP INDEX IF EXISTS idx_sfs_listings_order")
+                await connection.execute("CREATE INDEX IF NOT EXISTS idx_sfs_listings_page ON sfs_listings (refreshed_at DESC, created_at DESC, owner_id DESC)")
+                await connection.execute("CREATE INDEX IF NOT EXISTS idx_channels_owner_type ON channels (owner_id, type)")
                 await connection.commit()
                 logger.info("Tabele Multi-Tenant zainicjalizowane")
                 await self._migrate_bot_settings_user_id()
@@ -1,15 +1,41 @@
 """
 Modele danych i operacje CRUD dla bazy danych
 """
+import asyncio
 import json
 import logging
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from dataclasses import dataclass
 from .connection import db_manager, USE_POSTGRES
 
 logger = logging.getLogger("database")
 
+# Cache kanałów użytkownika (ChannelManager.get_user_channels_cached): user_id -> (monotonic, kanały)
+_USER_CHANNELS_TTL = 30.0
+_user_channels_cache: Dict[int, Tuple[float, List[Dict[str, Any]]]] = {}
+
+# Cache listy user_id z bot_users (BotUsersManager.get_all_user_ids_cached): (monotonic, lista, zbiór)
+_BOT_USER_IDS_TTL = 30.0
+_bot_user_ids_cache: Optional[Tuple[float, List[int], frozenset]] = None
+_bot_user_ids_lock = asyncio.Lock()
+
+# Userzy na pewno obecni w bot_users (ensure/upsert w tym procesie): user_id -> monotonic; LRU do _ENSURED_MAX
+_ENSURED_TTL = 300.0
+_ENSURED_MAX = 100_000
+_ensured_users: "OrderedDict[int, float]" = OrderedDict()
+
+
+def _mark_ensured(user_ids) -> None:
+    now = time.monotonic()
+    for uid in user_ids:
+        _ensured_users[uid] = now
+        _ensured_users.move_to_end(uid)
+    while len(_ensured_users) > _ENSURED_MAX:
+        _ensured_users.popitem(last=False)
+
 
 def _record_to_dict(row) -> Optional[Dict[str, Any]]:
     """Konwersja wiersza (aiosqlite Row / asyncpg Record) na dict."""
@@ -23,6 +49,21 @@ def _record_to_dict(row) -> Optional[Dict[str, Any]]:
         return None
 
 
+def _split_total(rows) -> Tuple[Optional[int], List[Dict[str, Any]]]:
+    """Wiersze z kolumną total (COUNT(*) OVER()) -> (total, wiersze bez total). Brak wierszy -> (None, [])."""
+    result = []
+    for row in rows:
+        d = _record_to_dict(row)
+        if d is not None:
+            result.append(d)
+    if not result:
+        return None, []
+    total = int(result[0].get("total") or 0)
+    for d in result:
+        d.pop("total", None)
+    return total, result
+
+
 def _row_datetime(value):
     """Z wartości z wiersza (datetime lub string) zwraca datetime. Dla PostgreSQL asyncpg zwraca datetime."""
     if value is None:
@@ -56,6 +97,58 @@ class ChannelManager:
             logger.error(f"Błąd pobierania kanałów użytkownika {user_id}: {e}")
             return []
 
+    @staticmethod
+    async def get_user_channels_by_type(user_id: int, channel_type: str) -> List[Dict[str, Any]]:
+        """Kanały użytkownika danego typu (channel_id, title, type) – filtr po stronie bazy (indeks owner_id, type)."""
+        try:
+            connection = await db_manager.get_connection()
+            async with connection.execute(
+                "SELECT channel_id, title, type FROM channels WHERE owner_id = ? AND type = ?",
+                (user_id, channel_type),
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Błąd pobierania kanałów {channel_type} użytkownika {user_id}: {e}")
+            return []
+
+    @staticmethod
+    async def get_user_free_channel(user_id: int) -> Optional[Dict[str, Any]]:
+        """Pierwszy (najwcześniej dodany) kanał typu free użytkownika – filtr po stronie bazy."""
+        try:
+            connection = await db_manager.get_connection()
+            async with connection.execute(
+                "SELECT * FROM channels WHERE owner_id = ? AND type = 'free' ORDER BY created_at, channel_id LIMIT 1",
+                (user_id,),
+            ) as cursor:
+                row = await cursor.fetchone()
+            return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Błąd pobierania kanału free użytkownika {user_id}: {e}")
+            return None
+
+    @staticmethod
+    async def get_user_channels_cached(user_id: int) -> List[Dict[str, Any]]:
+        """
+        Kanały użytkownika z cache w pamięci (TTL 30 s) – dla ekranów klikanych wielokrotnie (SFS, skróty).
+        Zwracana lista jest współdzielona – nie modyfikować.
+        """
+        now = time.monotonic()
+        hit = _user_channels_cache.get(user_id)
+        if hit and now - hit[0] < _USER_CHANNELS_TTL:
+            return hit[1]
+        channels = await ChannelManager.get_user_channels(user_id)
+        _user_channels_cache[user_id] = (now, channels)
+        return channels
+
+    @staticmethod
+    def invalidate_user_channels(user_id: Optional[int] = None) -> None:
+        """Unieważnienie cache kanałów (jednego usera lub całego – gdy właściciel nieznany)."""
+        if user_id is None:
+            _user_channels_cache.clear()
+        else:
+            _user_channels_cache.pop(user_id, None)
+
     @staticmethod
     async def get_channel(channel_id: int) -> Optional[Dict[str, Any]]:
         """Pobranie szczegółów kanału"""
@@ -89,6 +182,8 @@ class ChannelManager:
                 """, (channel_id, owner_id, title, type)): pass
             
             await connection.commit()
+            # Kanał mógł zmienić właściciela (ON CONFLICT / OR REPLACE) – czyścimy cały cache
+            ChannelManager.invalidate_user_channels()
             logger.info(f"Dodano kanał {title} ({channel_id}) dla {owner_id}")
             return True
             
@@ -135,6 +230,35 @@ class ChannelManager:
             logger.error(f"Błąd get_all_channels: {e}")
             return []
 
+    @staticmethod
+    async def get_all_channels_with_total(
+        page: int = 0, per_page: int = 10, type_filter: Optional[str] = None
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Strona kanałów + łączna liczba w jednym zapytaniu (COUNT(*) OVER())."""
+        try:
+            connection = await db_manager.get_connection()
+            offset = page * per_page
+            if type_filter:
+                async with connection.execute(
+                    "SELECT *, COUNT(*) OVER() AS total FROM channels WHERE type = ? ORDER BY channel_id LIMIT ? OFFSET ?",
+                    (type_filter, per_page, offset)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+            else:
+                async with connection.execute(
+                    "SELECT *, COUNT(*) OVER() AS total FROM channels ORDER BY channel_id LIMIT ? OFFSET ?",
+                    (per_page, offset)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+            total, result = _split_total(rows)
+            if total is None:
+                # Strona za końcem listy – licznik osobno
+                total = await ChannelManager.count_all_channels(type_filter) if page > 0 else 0
+            return total, result
+        except Exception as e:
+            logger.error(f"Błąd get_all_channels_with_total: {e}")
+            return 0, []
+
     @staticmethod
     async def count_all_channels(type_filter: Optional[str] = None) -> int:
         """Liczba wszystkich kanałów (super-admin). type_filter: None, 'premium', 'free'."""
@@ -157,42 +281,70 @@ class ChannelManager:
 class GlobalBlacklist:
     """Globalna czarna lista użytkowników (super-admin)."""
 
+    # Kopia listy w pamięci (wczytywana przy starcie przez load_cache); None = jeszcze nie wczytana,
+    # wtedy is_banned pyta bazę
+    _cache: Optional[set] = None
+    _cache_lock = asyncio.Lock()
+
+    @staticmethod
+    async def load_cache() -> int:
+        """Wczytanie wszystkich user_id z global_blacklist do pamięci. Zwraca liczbę wpisów."""
+        async with GlobalBlacklist._cache_lock:
+            try:
+                connection = await db_manager.get_connection()
+                async with connection.execute("SELECT user_id FROM global_blacklist") as cursor:
+                    rows = await cursor.fetchall()
+                GlobalBlacklist._cache = {int(r["user_id"]) for r in rows}
+                return len(GlobalBlacklist._cache)
+            except Exception as e:
+                logger.error(f"Błąd global_blacklist load_cache: {e}")
+                GlobalBlacklist._cache = None
+                return 0
+
     @staticmethod
     async def add(user_id: int, reason: Optional[str] = None) -> bool:
-        try:
-            connection = await db_manager.get_connection()
-            now_dt = datetime.now()
-            now_param = now_dt if USE_POSTGRES else now_dt.isoformat()
-            if USE_POSTGRES:
-                async with connection.execute("""
-                    INSERT INTO global_blacklist (user_id, reason, created_at)
-                    VALUES ($1, $2, $3)
-                    ON CONFLICT (user_id) DO UPDATE SET reason = EXCLUDED.reason, created_at = EXCLUDED.created_at
-                """, (user_id, reason or "", now_param)): pass
-            else:
-                async with connection.execute("""
-                    INSERT OR REPLACE INTO global_blacklist (user_id, reason, created_at)
-                    VALUES (?, ?, ?)
-                """, (user_id, reason or "", now_param)): pass
-            await connection.commit()
-            return True
-        except Exception as e:
-            logger.error(f"Błąd global_blacklist add: {e}")
-            return False
+        async with GlobalBlacklist._cache_lock:
+            try:
+                connection = await db_manager.get_connection()
+                now_dt = datetime.now()
+                now_param = now_dt if USE_POSTGRES else now_dt.isoformat()
+                if USE_POSTGRES:
+                    async with connection.execute("""
+                        INSERT INTO global_blacklist (user_id, reason, created_at)
+                        VALUES ($1, $2, $3)
+                        ON CONFLICT (user_id) DO UPDATE SET reason = EXCLUDED.reason, created_at = EXCLUDED.created_at
+                    """, (user_id, reason or "", now_param)): pass
+                else:
+                    async with connection.execute("""
+                        INSERT OR REPLACE INTO global_blacklist (user_id, reason, created_at)
+                        VALUES (?, ?, ?)
+                    """, (user_id, reason or "", now_param)): pass
+                await connection.commit()
+                if GlobalBlacklist._cache is not None:
+                    GlobalBlacklist._cache.add(user_id)
+                return True
+            except Exception as e:
+                logger.error(f"Błąd global_blacklist add: {e}")
+                return False
 
     @staticmethod
     async def remove(user_id: int) -> bool:
-        try:
-            connection = await db_manager.get_connection()
-            async with connection.execute("DELETE FROM global_blacklist WHERE user_id = ?", (user_id,)): pass
-            await connection.commit()
-            return True
-        except Exception as e:
-            logger.error(f"Błąd global_blacklist remove: {e}")
-            return False
+        async with GlobalBlacklist._cache_lock:
+            try:
+                connection = await db_manager.get_connection()
+                async with connection.execute("DELETE FROM global_blacklist WHERE user_id = ?", (user_id,)): pass
+                await connection.commit()
+                if GlobalBlacklist._cache is not None:
+                    GlobalBlacklist._cache.discard(user_id)
+                return True
+            except Exception as e:
+                logger.error(f"Błąd global_blacklist remove: {e}")
+                return False
 
     @staticmethod
     async def is_banned(user_id: int) -> bool:
+        if GlobalBlacklist._cache is not None:
+            return user_id in GlobalBlacklist._cache
         try:
             connection = await db_manager.get_connection()
             async with connection.execute("SELECT 1 FROM global_blacklist WHERE user_id = ?", (user_id,)) as cursor:
@@ -233,7 +385,10 @@ class BotUsersManager:
 
     @staticmethod
     async def ensure_user(user_id: int) -> bool:
-        """Dodaj user_id do bot_users jeśli nie ma (np. przy /start)."""
+        """Dodaj user_id do bot_users jeśli nie ma (np. przy /start). Zapisany niedawno (_ENSURED_TTL) – bez zapytania."""
+        seen = _ensured_users.get(user_id)
+        if seen is not None and time.monotonic() - seen < _ENSURED_TTL:
+            return True
         try:
             connection = await db_manager.get_connection()
             now_dt = datetime.now()
@@ -249,6 +404,8 @@ class BotUsersManager:
                     (user_id, now_param),
                 ): pass
             await connection.commit()
+            BotUsersManager.invalidate_cache(user_id)
+            _mark_ensured((user_id,))
             return True
         except Exception as e:
             logger.error(f"Błąd bot_users ensure: {e}")
@@ -266,6 +423,32 @@ class BotUsersManager:
             logger.error(f"Błąd bot_users get_all: {e}")
             return []
 
+    @staticmethod
+    async def get_all_user_ids_cached() -> List[int]:
+        """
+        get_all_user_ids z cache w pamięci (TTL 30 s) – kreator broadcastu pyta o listę kilka razy w ciągu sekund.
+        Zwracana lista jest współdzielona – nie modyfikować.
+        """
+        global _bot_user_ids_cache
+        hit = _bot_user_ids_cache
+        if hit and time.monotonic() - hit[0] < _BOT_USER_IDS_TTL:
+            return hit[1]
+        async with _bot_user_ids_lock:
+            hit = _bot_user_ids_cache
+            if hit and time.monotonic() - hit[0] < _BOT_USER_IDS_TTL:
+                return hit[1]
+            ids = await BotUsersManager.get_all_user_ids()
+            _bot_user_ids_cache = (time.monotonic(), ids, frozenset(ids))
+            return ids
+
+    @staticmethod
+    def invalidate_cache(user_id: Optional[int] = None) -> None:
+        """Unieważnienie cache user_id; z user_id – tylko gdy to nowy użytkownik (nie ma go w cache)."""
+        global _bot_user_ids_cache
+        if user_id is not None and _bot_user_ids_cache and user_id in _bot_user_ids_cache[2]:
+            return
+        _bot_user_ids_cache = None
+
     @staticmethod
     async def get_user_display(user_id: int) -> Optional[Dict[str, Any]]:
         """Pobranie last_username, last_full_name dla wyświetlenia w panelu."""
@@ -289,67 +472,101 @@ class BotUsersManager:
             return None
 
     @staticmethod
-    async def update_user_display_info(
+    async def upsert_display(
         user_id: int, username: Optional[str] = None, full_name: Optional[str] = None
     ) -> bool:
-        """Aktualizacja last_username i last_full_name (wyświetlanie w panelu aktywni użytkownicy)."""
+        """Wpis użytkownika + aktualizacja last_username / last_full_name w jednym zapytaniu (INSERT ... ON CONFLICT DO UPDATE)."""
         try:
             connection = await db_manager.get_connection()
+            now_dt = datetime.now()
+            now_param = now_dt if USE_POSTGRES else now_dt.isoformat()
+            params = (user_id, now_param, username or None, full_name or None)
             if USE_POSTGRES:
                 async with connection.execute("""
-                    UPDATE bot_users SET last_username = COALESCE($1, last_username), last_full_name = COALESCE($2, last_full_name)
-                    WHERE user_id = $3
-                """, (username or None, full_name or None, user_id)): pass
+                    INSERT INTO bot_users (user_id, first_seen, last_username, last_full_name) VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        last_username = COALESCE(EXCLUDED.last_username, bot_users.last_username),
+                        last_full_name = COALESCE(EXCLUDED.last_full_name, bot_users.last_full_name)
+                """, params): pass
             else:
                 async with connection.execute("""
-                    UPDATE bot_users SET last_username = COALESCE(?, last_username), last_full_name = COALESCE(?, last_full_name)
-                    WHERE user_id = ?
-                """, (username or None, full_name or None, user_id)): pass
+                    INSERT INTO bot_users (user_id, first_seen, last_username, last_full_name) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        last_username = COALESCE(excluded.last_username, bot_users.last_username),
+                        last_full_name = COALESCE(excluded.last_full_name, bot_users.last_full_name)
+                """, params): pass
             await connection.commit()
+            BotUsersManager.invalidate_cache(user_id)
+            _mark_ensured((user_id,))
             return True
         except Exception as e:
-            logger.error(f"Błąd update_user_display_info: {e}")
+            logger.error(f"Błąd bot_users upsert_display: {e}")
             return False
 
     @staticmethod
-    async def get_users_with_activity(page: int = 0, per_page: int = 15) -> List[Dict[str, Any]]:
-        """Użytkownicy bota (z bot_users), posortowani po ostatniej aktywności (logi lub first_seen)."""
+    async def bulk_upsert_display(rows: List[Tuple[int, Optional[str], Optional[str]]]) -> bool:
+        """upsert_display dla wielu userów naraz: (user_id, username, full_name). user_id muszą być unikalne."""
+        if not rows:
+            return True
         try:
             connection = await db_manager.get_connection()
-            offset = page * per_page
+            now_dt = datetime.now()
             if USE_POSTGRES:
-                sql = """
-                    SELECT u.user_id, u.last_username, u.last_full_name,
-                           COALESCE(MAX(l.created_at), u.first_seen) AS last_activity
-                    FROM bot_users u
-                    LEFT JOIN user_interaction_logs l ON l.user_id = u.user_id
-                    GROUP BY u.user_id, u.last_username, u.last_full_name, u.first_seen
-                    ORDER BY last_activity DESC NULLS LAST
-                    LIMIT $1 OFFSET $2
-                """
-                async with connection.execute(sql, (per_page, offset)) as cursor:
-                    rows = await cursor.fetchall()
+                async with connection.execute("""
+                    INSERT INTO bot_users (user_id, first_seen, last_username, last_full_name)
+                    SELECT u, $4, n, f FROM UNNEST($1::bigint[], $2::text[], $3::text[]) AS t(u, n, f)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        last_username = COALESCE(EXCLUDED.last_username, bot_users.last_username),
+                        last_full_name = COALESCE(EXCLUDED.last_full_name, bot_users.last_full_name)
+                """, ([u for u, _, _ in rows], [n or None for _, n, _ in rows], [f or None for _, _, f in rows], now_dt)): pass
             else:
-                sql = """
-                    SELECT u.user_id, u.last_username, u.last_full_name,
-                           COALESCE(MAX(l.created_at), u.first_seen) AS last_activity
-                    FROM bot_users u
-                    LEFT JOIN user_interaction_logs l ON l.user_id = u.user_id
-                    GROUP BY u.user_id, u.last_username, u.last_full_name, u.first_seen
-                    ORDER BY last_activity DESC
-                    LIMIT ? OFFSET ?
-                """
-                async with connection.execute(sql, (per_page, offset)) as cursor:
-                    rows = await cursor.fetchall()
-            result = []
-            for row in rows:
-                d = _record_to_dict(row)
-                if d is not None:
-                    result.append(d)
-            return result
+                now = now_dt.isoformat()
+                # Limit zmiennych w SQLite – paczki po 200 wierszy
+                for i in range(0, len(rows), 200):
+                    chunk = rows[i:i + 200]
+                    values = ", ".join("(?, ?, ?, ?)" for _ in chunk)
+                    params = tuple(x for u, n, f in chunk for x in (u, now, n or None, f or None))
+                    async with connection.execute(f"""
+                        INSERT INTO bot_users (user_id, first_seen, last_username, last_full_name) VALUES {values}
+                        ON CONFLICT (user_id) DO UPDATE SET
+                            last_username = COALESCE(excluded.last_username, bot_users.last_username),
+                            last_full_name = COALESCE(excluded.last_full_name, bot_users.last_full_name)
+                    """, params): pass
+            await connection.commit()
+            for u, _, _ in rows:
+                BotUsersManager.invalidate_cache(u)
+            _mark_ensured(u for u, _, _ in rows)
+            return True
         except Exception as e:
-            logger.error(f"Błąd get_users_with_activity: {e}")
-            return []
+            logger.error(f"Błąd bot_users bulk_upsert_display: {e}")
+            return False
+
+    @staticmethod
+    async def page_with_total(page: int = 0, per_page: int = 15) -> Tuple[int, List[Dict[str, Any]]]:
+        """Strona użytkowników posortowana po ostatniej aktywności (logi lub first_seen) + łączna liczba w jednym zapytaniu (COUNT(*) OVER() po GROUP BY)."""
+        try:
+            connection = await db_manager.get_connection()
+            offset = page * per_page
+            nulls_last = " NULLS LAST" if USE_POSTGRES else ""
+            sql = f"""
+                SELECT u.user_id, u.last_username, u.last_full_name,
+                       COALESCE(MAX(l.created_at), u.first_seen) AS last_activity,
+                       COUNT(*) OVER() AS total
+                FROM bot_users u
+                LEFT JOIN user_interaction_logs l ON l.user_id = u.user_id
+                GROUP BY u.user_id, u.last_username, u.last_full_name, u.first_seen
+                ORDER BY last_activity DESC{nulls_last}
+                LIMIT ? OFFSET ?
+            """
+            async with connection.execute(sql, (per_page, offset)) as cursor:
+                rows = await cursor.fetchall()
+            total, result = _split_total(rows)
+            if total is None:
+                total = await BotUsersManager.count_users_with_activity() if page > 0 else 0
+            return total, result
+        except Exception as e:
+            logger.error(f"Błąd page_with_total: {e}")
+            return 0, []
 
     @staticmethod
     async def count_users_with_activity() -> int:
@@ -397,12 +614,54 @@ class UserInteractionLog:
             return False
 
     @staticmethod
-    async def get_last_for_user(user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+    async def bulk_add(rows: List[Tuple[int, str, Optional[str], datetime]]) -> bool:
+        """Wiele logów jednym INSERT: (user_id, event_type, content_preview, created_at)."""
+        if not rows:
+            return True
+        connection = None
         try:
             connection = await db_manager.get_connection()
             if USE_POSTGRES:
                 async with connection.execute("""
-                    SELECT id, user_id, event_type, content_preview, created_at
+                    INSERT INTO user_interaction_logs (user_id, event_type, content_preview, created_at)
+                    SELECT * FROM UNNEST($1::bigint[], $2::text[], $3::text[], $4::timestamp[])
+                """, (
+                    [r[0] for r in rows],
+                    [r[1] for r in rows],
+                    [(r[2] or "")[:500] for r in rows],
+                    [r[3] for r in rows],
+                )): pass
+            else:
+                # executemany = jedno wywołanie na wspólnym połączeniu: commit innej korutyny nie wpadnie
+                # w połowę paczki, a przy błędzie rollback cofa całość (ponowna próba nie dubluje wierszy)
+                await connection.executemany(
+                    "INSERT INTO user_interaction_logs (user_id, event_type, content_preview, created_at) VALUES (?, ?, ?, ?)",
+                    [(u, t, (p or "")[:500], c.isoformat()) for u, t, p, c in rows],
+                )
+            await connection.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Błąd user_interaction_log bulk_add: {e}")
+            if connection is not None and not USE_POSTGRES:
+                try:
+                    await connection.rollback()
+                except Exception:
+                    pass
+            return False
+
+    @staticmethod
+    async def get_last_for_user(
+        user_id: int, limit: int = 20, preview_len: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Ostatnie logi użytkownika; preview_len – przycięcie content_preview już w SQL (mniej danych z bazy)."""
+        try:
+            connection = await db_manager.get_connection()
+            preview_col = "content_preview"
+            if preview_len:
+                preview_col = f"SUBSTR(content_preview, 1, {int(preview_len)}) AS content_preview"
+            if USE_POSTGRES:
+                async with connection.execute(f"""
+                    SELECT id, user_id, event_type, {preview_col}, created_at
                     FROM user_interaction_logs
                     WHERE user_id = $1
                     ORDER BY created_at DESC
@@ -410,8 +669,8 @@ class UserInteractionLog:
                 """, (user_id, limit)) as cursor:
                     rows = await cursor.fetchall()
             else:
-                async with connection.execute("""
-                    SELECT id, user_id, event_type, content_preview, created_at
+                async with connection.execute(f"""
+                    SELECT id, user_id, event_type, {preview_col}, created_at
                     FROM user_interaction_logs
                     WHERE user_id = ?
                     ORDER BY created_at DESC
@@ -427,8 +686,29 @@ class UserInteractionLog:
 class InboxMuted:
     """Wyciszeni użytkownicy – admin nie dostaje powiadomień z inbox od tych userów."""
 
+    # Kopia w pamięci (load_cache przy starcie); None = jeszcze nie wczytana, wtedy pytamy bazę
+    _cache: Optional[set] = None
+    _cache_lock = asyncio.Lock()
+
+    @staticmethod
+    async def load_cache() -> int:
+        """Wczytanie wszystkich wyciszonych user_id do pamięci. Zwraca liczbę wpisów."""
+        async with InboxMuted._cache_lock:
+            try:
+                connection = await db_manager.get_connection()
+                async with connection.execute("SELECT user_id FROM inbox_muted") as cursor:
+                    rows = await cursor.fetchall()
+                InboxMuted._cache = {int(r["user_id"]) for r in rows}
+                return len(InboxMuted._cache)
+            except Exception as e:
+                logger.error(f"Błąd inbox_muted load_cache: {e}")
+                InboxMuted._cache = None
+                return 0
+
     @staticmethod
     async def is_muted(user_id: int) -> bool:
+        if InboxMuted._cache is not None:
+            return user_id in InboxMuted._cache
         try:
             connection = await db_manager.get_connection()
             async with connection.execute("SELECT 1 FROM inbox_muted WHERE user_id = ?", (user_id,)) as cursor:
@@ -439,31 +719,37 @@ class InboxMuted:
 
     @staticmethod
     async def add(user_id: int) -> bool:
-        try:
-            connection = await db_manager.get_connection()
-            if USE_POSTGRES:
-                async with connection.execute(
-                    "INSERT INTO inbox_muted (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING",
-                    (user_id,),
-                ): pass
-            else:
-                async with connection.execute("INSERT OR IGNORE INTO inbox_muted (user_id) VALUES (?)", (user_id,)): pass
-            await connection.commit()
-            return True
-        except Exception as e:
-            logger.error(f"Błąd inbox_muted add: {e}")
-            return False
+        async with InboxMuted._cache_lock:
+            try:
+                connection = await db_manager.get_connection()
+                if USE_POSTGRES:
+                    async with connection.execute(
+                        "INSERT INTO inbox_muted (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING",
+                        (user_id,),
+                    ): pass
+                else:
+                    async with connection.execute("INSERT OR IGNORE INTO inbox_muted (user_id) VALUES (?)", (user_id,)): pass
+                await connection.commit()
+                if InboxMuted._cache is not None:
+                    InboxMuted._cache.add(user_id)
+                return True
+            except Exception as e:
+                logger.error(f"Błąd inbox_muted add: {e}")
+                return False
 
     @staticmethod
     async def remove(user_id: int) -> bool:
-        try:
-            connection = await db_manager.get_connection()
-            async with connection.execute("DELETE FROM inbox_muted WHERE user_id = ?", (user_id,)): pass
-            await connection.commit()
-            return True
-        except Exception as e:
-            logger.error(f"Błąd inbox_muted remove: {e}")
-            return False
+        async with InboxMuted._cache_lock:
+            try:
+                connection = await db_manager.get_connection()
+                async with connection.execute("DELETE FROM inbox_muted WHERE user_id = ?", (user_id,)): pass
+                await connection.commit()
+                if InboxMuted._cache is not None:
+                    InboxMuted._cache.discard(user_id)
+                return True
+            except Exception as e:
+                logger.error(f"Błąd inbox_muted remove: {e}")
+                return False
 
 
 class SettingsManager:
@@ -607,16 +893,28 @@ class SettingsManager:
         limit = max(1, min(500, int(limit)))
         return await SettingsManager.set_setting("max_scheduled_posts", str(limit), user_id)
 
+    # Tryb konserwacji sprawdzany przy każdym update (AuthMiddleware) – (czas odczytu, wartość), ważne _MAINTENANCE_TTL s
+    _MAINTENANCE_TTL = 5.0
+    _maintenance: Optional[Tuple[float, bool]] = None
+
     @staticmethod
     async def get_maintenance_mode() -> bool:
         """Tryb konserwacji (user_id=0, klucz maintenance_mode)."""
+        hit = SettingsManager._maintenance
+        if hit is not None and time.monotonic() - hit[0] < SettingsManager._MAINTENANCE_TTL:
+            return hit[1]
         val = await SettingsManager.get_setting("maintenance_mode", 0)
-        return (val or "").lower() in ("true", "1", "yes")
+        enabled = (val or "").lower() in ("true", "1", "yes")
+        SettingsManager._maintenance = (time.monotonic(), enabled)
+        return enabled
 
     @staticmethod
     async def set_maintenance_mode(enabled: bool) -> bool:
         """Włączenie/wyłączenie trybu konserwacji."""
-        return await SettingsManager.set_setting("maintenance_mode", "true" if enabled else "false", 0)
+        ok = await SettingsManager.set_setting("maintenance_mode", "true" if enabled else "false", 0)
+        # Zmiana widoczna od razu w tym procesie (bez czekania na TTL)
+        SettingsManager._maintenance = (time.monotonic(), enabled) if ok else None
+        return ok
 
 
 @dataclass
@@ -1051,6 +1349,35 @@ class SubscriptionManager:
             logger.error(f"Błąd get_all_subscriptions_paginated: {e}")
             return []
 
+    @staticmethod
+    async def get_subscriptions_page_with_total(
+        channel_id: Optional[int] = None, page: int = 0, per_page: int = 20
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Strona subskrypcji + łączna liczba w jednym zapytaniu (COUNT(*) OVER())."""
+        try:
+            connection = await db_manager.get_connection()
+            offset = page * per_page
+            if channel_id is not None:
+                async with connection.execute(
+                    """SELECT *, COUNT(*) OVER() AS total FROM subscriptions WHERE channel_id = ?
+                       ORDER BY end_date DESC LIMIT ? OFFSET ?""",
+                    (channel_id, per_page, offset),
+                ) as cursor:
+                    rows = await cursor.fetchall()
+            else:
+                async with connection.execute(
+                    """SELECT *, COUNT(*) OVER() AS total FROM subscriptions ORDER BY end_date DESC LIMIT ? OFFSET ?""",
+                    (per_page, offset),
+                ) as cursor:
+                    rows = await cursor.fetchall()
+            total, result = _split_total(rows)
+            if total is None:
+                total = await SubscriptionManager.count_subscriptions(channel_id) if page > 0 else 0
+            return total, result
+        except Exception as e:
+            logger.error(f"Błąd get_subscriptions_page_with_total: {e}")
+            return 0, []
+
     @staticmethod
     async def count_subscriptions(channel_id: Optional[int] = None) -> int:
         """Liczba subskrypcji (super-admin). channel_id=None = wszystkie."""
@@ -1276,45 +1603,6 @@ class PostManager:
             logger.error(f"Błąd zliczania postów {owner_id}: {e}")
             return 0
 
-    @staticmethod
-    async def get_post_by_id(post_id: int, owner_id: Optional[int] = None) -> Optional[ScheduledPost]:
-        """Pobranie pojedynczego posta po ID (opcjonalnie z walidacją owner_id)."""
-        try:
-            connection = await db_manager.get_connection()
-            if owner_id is not None:
-                async with connection.execute(
-                    "SELECT * FROM scheduled_posts WHERE post_id = ? AND owner_id = ?",
-                    (post_id, owner_id),
-                ) as cursor:
-                    row = await cursor.fetchone()
-            else:
-                async with connection.execute(
-                    "SELECT * FROM scheduled_posts WHERE post_id = ?", (post_id,)
-                ) as cursor:
-                    row = await cursor.fetchone()
-            if not row:
-                return None
-            try:
-                ch_id = row["channel_id"]
-            except (KeyError, IndexError):
-                ch_id = None
-            ch_id = int(ch_id) if ch_id is not None else 0
-            return ScheduledPost(
-                post_id=row["post_id"],
-                owner_id=row["owner_id"],
-                channel_id=ch_id,
-                content_type=row["content_type"],
-                content=row["content"],
-                caption=row["caption"],
-                buttons_json=row["buttons_json"],
-                publish_date=_parse_publish_date(row["publish_date"]),
-                status=row["status"],
-                created_at=_row_datetime(row.get("created_at"))
-            )
-        except Exception as e:
-            logger.error(f"Błąd pobierania posta {post_id}: {e}")
-            return None
-
     @staticmethod
     async def get_posts_to_publish() -> List[ScheduledPost]:
         """Pobranie postów gotowych do publikacji (z channel_id). Porównanie dat po stringu ISO."""
@@ -1375,23 +1663,37 @@ class PostManager:
             return False
     
     @staticmethod
-    async def delete_post(post_id: int) -> bool:
-        """Usunięcie zaplanowanego posta"""
+    async def delete_and_list(owner_id: int, post_id: int) -> Tuple[bool, List[ScheduledPost], int]:
+        """
+        Usunięcie posta właściciela (jedno zapytanie z walidacją owner_id) + odświeżona lista i limit.
+        Zwraca (czy_usunięto, pending_posty, max_limit); lista i limit pobierane równolegle.
+        """
+        deleted = False
         try:
             connection = await db_manager.get_connection()
-            
-            async with connection.execute("""
-                DELETE FROM scheduled_posts 
-                WHERE post_id = ?
-            """, (post_id,)): pass
+            if USE_POSTGRES:
+                async with connection.execute(
+                    "DELETE FROM scheduled_posts WHERE post_id = $1 AND owner_id = $2 RETURNING post_id",
+                    (post_id, owner_id),
+                ) as cursor:
+                    deleted = await cursor.fetchone() is not None
+            else:
+                # rowcount kursora DELETE – osobne SELECT changes() na wspólnym połączeniu mogłoby złapać cudzy zapis
+                async with connection.execute(
+                    "DELETE FROM scheduled_posts WHERE post_id = ? AND owner_id = ?",
+                    (post_id, owner_id),
+                ) as cursor:
+                    deleted = cursor.rowcount > 0
             await connection.commit()
-            
-            logger.info(f"Usunięto zaplanowany post {post_id}")
-            return True
-            
+            if deleted:
+                logger.info(f"Usunięto zaplanowany post {post_id}")
         except Exception as e:
-            logger.error(f"Błąd usuwania posta: {e}")
-            return False
+            logger.error(f"Błąd usuwania posta {post_id}: {e}")
+        posts, max_posts = await asyncio.gather(
+            PostManager.get_scheduled_posts(owner_id),
+            SettingsManager.get_max_scheduled_posts(owner_id),
+        )
+        return deleted, posts, max_posts
 
 
 class SFSManager:
@@ -1425,25 +1727,32 @@ class SFSManager:
 
     @staticmethod
     async def get_listings_page(page: int, per_page: int = 10) -> List[Dict[str, Any]]:
-        """Strona listy SFS z reputacją (łapki) po owner_id. Sortowanie: refreshed_at DESC, created_at DESC."""
+        """Strona listy SFS z reputacją (łapki) po owner_id. Sortowanie: refreshed_at DESC, created_at DESC, owner_id DESC."""
         try:
             connection = await db_manager.get_connection()
             offset = page * per_page
-            # Podzapytanie dla agregatów – zgodne z PostgreSQL (GROUP BY) i SQLite
+            # Strona wpisów liczona raz (CTE, LIMIT po indeksie idx_sfs_listings_page), łapki tylko dla
+            # jej owner_id – agregat nie przechodzi po ocenach całej listy. owner_id (UNIQUE) na końcu
+            # sortowania: przy równych datach kolejność jest jednoznaczna. Zgodne z PostgreSQL i SQLite.
             async with connection.execute("""
+                WITH page AS (
+                    SELECT * FROM sfs_listings
+                    ORDER BY refreshed_at DESC, created_at DESC, owner_id DESC
+                    LIMIT ? OFFSET ?
+                )
                 SELECT l.*,
                     COALESCE(stats.thumbs_up, 0) AS thumbs_up,
                     COALESCE(stats.thumbs_down, 0) AS thumbs_down
-                FROM sfs_listings l
+                FROM page l
                 LEFT JOIN (
-                    SELECT owner_id,
-                        SUM(CASE WHEN vote = 1 THEN 1 ELSE 0 END) AS thumbs_up,
-                        SUM(CASE WHEN vote = -1 THEN 1 ELSE 0 END) AS thumbs_down
-                    FROM sfs_ratings
-                    GROUP BY owner_id
+                    SELECT r.owner_id,
+                        SUM(CASE WHEN r.vote = 1 THEN 1 ELSE 0 END) AS thumbs_up,
+                        SUM(CASE WHEN r.vote = -1 THEN 1 ELSE 0 END) AS thumbs_down
+                    FROM sfs_ratings r
+                    WHERE r.owner_id IN (SELECT owner_id FROM page)
+                    GROUP BY r.owner_id
                 ) stats ON stats.owner_id = l.owner_id
-                ORDER BY l.refreshed_at DESC, l.created_at DESC
-                LIMIT ? OFFSET ?
+                ORDER BY l.refreshed_at DESC, l.created_at DESC, l.owner_id DESC
             """, (per_page, offset)) as cursor:
                 rows = await cursor.fetchall()
             return [dict(row) for row in rows]
@@ -1557,37 +1866,52 @@ class SFSManager:
             return True
 
     @staticmethod
-    async def set_rating(owner_id: int, rater_user_id: int, vote: int) -> bool:
-        """Ustawienie oceny użytkownika (owner_id): vote 1 = thumbs up, -1 = thumbs down. Reputacja nie resetuje się przy usunięciu ogłoszenia."""
+    async def bulk_set_rating(rows: List[Tuple[int, int, int]]) -> bool:
+        """Zapis wielu ocen naraz: (owner_id, rater_user_id, vote). Pary (owner_id, rater) muszą być unikalne."""
+        if not rows:
+            return True
         try:
             connection = await db_manager.get_connection()
             now_dt = datetime.now()
-            now = now_dt if USE_POSTGRES else now_dt.isoformat()
             if USE_POSTGRES:
                 async with connection.execute("""
                     INSERT INTO sfs_ratings (owner_id, rater_user_id, vote, created_at)
-                    VALUES ($1, $2, $3, $4)
+                    SELECT o, r, v, $4 FROM UNNEST($1::bigint[], $2::bigint[], $3::int[]) AS t(o, r, v)
                     ON CONFLICT (owner_id, rater_user_id) DO UPDATE SET vote = EXCLUDED.vote, created_at = EXCLUDED.created_at
-                """, (owner_id, rater_user_id, vote, now)): pass
+                """, ([o for o, _, _ in rows], [r for _, r, _ in rows], [v for _, _, v in rows], now_dt)): pass
             else:
-                async with connection.execute("""
-                    INSERT OR REPLACE INTO sfs_ratings (owner_id, rater_user_id, vote, created_at)
-                    VALUES (?, ?, ?, ?)
-                """, (owner_id, rater_user_id, vote, now)): pass
+                now = now_dt.isoformat()
+                # Limit zmiennych w SQLite – paczki po 200 wierszy
+                for i in range(0, len(rows), 200):
+                    chunk = rows[i:i + 200]
+                    values = ", ".join("(?, ?, ?, ?)" for _ in chunk)
+                    params = tuple(x for o, r, v in chunk for x in (o, r, v, now))
+                    async with connection.execute(
+                        f"INSERT OR REPLACE INTO sfs_ratings (owner_id, rater_user_id, vote, created_at) VALUES {values}",
+                        params,
+                    ): pass
             await connection.commit()
             return True
         except Exception as e:
-            logger.error(f"SFS set_rating: {e}")
+            logger.error(f"SFS bulk_set_rating: {e}")
             return False
 
     @staticmethod
-    async def get_rating_counts(owner_id: int) -> tuple:
-        """Zwraca (thumbs_up, thumbs_down) dla owner_id (reputacja użytkownika)."""
+    async def get_rating_counts(owner_id: int, exclude_raters: Optional[List[int]] = None) -> tuple:
+        """
+        Zwraca (thumbs_up, thumbs_down) dla owner_id (reputacja użytkownika).
+        exclude_raters – pominięci oceniający (np. głosy jeszcze niezapisane, liczone osobno).
+        """
         try:
             connection = await db_manager.get_connection()
-            async with connection.execute("""
-                SELECT vote, COUNT(*) AS cnt FROM sfs_ratings WHERE owner_id = ? GROUP BY vote
-            """, (owner_id,)) as cursor:
+            exclude_sql = ""
+            params: tuple = (owner_id,)
+            if exclude_raters:
+                exclude_sql = " AND rater_user_id NOT IN (" + ", ".join("?" for _ in exclude_raters) + ")"
+                params += tuple(exclude_raters)
+            async with connection.execute(f"""
+                SELECT vote, COUNT(*) AS cnt FROM sfs_ratings WHERE owner_id = ?{exclude_sql} GROUP BY vote
+            """, params) as cursor:
                 rows = await cursor.fetchall()
             up = down = 0
             for row in rows:
@@ -1692,6 +2016,37 @@ class SFSManager:
             logger.error(f"SFS update_listing_members_count: {e}")
             return False
 
+    @staticmethod
+    async def bulk_update_members_count(pairs: List[Tuple[int, int]]) -> bool:
+        """Aktualizacja members_count dla wielu wpisów jednym UPDATE (pary owner_id, members_count)."""
+        if not pairs:
+            return True
+        try:
+            connection = await db_manager.get_connection()
+            if USE_POSTGRES:
+                async with connection.execute("""
+                    UPDATE sfs_listings AS l SET members_count = v.c
+                    FROM (SELECT UNNEST($1::bigint[]) AS owner_id, UNNEST($2::int[]) AS c) AS v
+                    WHERE l.owner_id = v.owner_id
+                """, ([o for o, _ in pairs], [c for _, c in pairs])): pass
+            else:
+                # Limit zmiennych w SQLite – paczki po 400 par
+                for i in range(0, len(pairs), 400):
+                    chunk = pairs[i:i + 400]
+                    values = ", ".join("(?, ?)" for _ in chunk)
+                    params = tuple(x for pair in chunk for x in pair)
+                    async with connection.execute(f"""
+                        WITH v(owner_id, c) AS (VALUES {values})
+                        UPDATE sfs_listings
+                        SET members_count = (SELECT c FROM v WHERE v.owner_id = sfs_listings.owner_id)
+                        WHERE owner_id IN (SELECT owner_id FROM v)
+                    """, params): pass
+            await connection.commit()
+            return True
+        except Exception as e:
+            logger.error(f"SFS bulk_update_members_count: {e}")
+            return False
+
     @staticmethod
     async def get_listing_by_channel_id(channel_id: int) -> Optional[Dict[str, Any]]:
         """Pobranie wpisu SFS po channel_id (kanał free)."""
@@ -113,6 +113,7 @@ async def delete_channel(callback: CallbackQuery, bot: Bot):
         connection = await db_manager.get_connection()
         async with connection.execute("DELETE FROM channels WHERE channel_id = ?", (channel_id,)): pass
         await connection.commit()
+        ChannelManager.invalidate_user_channels()
         
         await callback.answer("✅ Kanał usunięty!", show_alert=True)
 
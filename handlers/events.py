@@ -38,6 +38,11 @@ def get_pending_join_requests(channel_id: int) -> list[dict]:
     return list(_pending_join_requests.get(channel_id, []))
 
 
+def get_pending_join_requests_bulk(channel_ids: list[int]) -> dict[int, list[dict]]:
+    """Oczekujące join requesty dla wielu kanałów naraz: channel_id -> lista (kopia); kanały bez wniosków pominięte."""
+    return {cid: list(_pending_join_requests[cid]) for cid in channel_ids if cid in _pending_join_requests}
+
+
 def pop_pending_join_request(channel_id: int, user_id: int) -> bool:
     """Usuwa pierwszy pasujący join request (channel_id, user_id). Zwraca True jeśli usunięto."""
     lst = _pending_join_requests.get(channel_id, [])
@@ -2,10 +2,10 @@
 Inbox: przekazywanie do wszystkich superadminów wiadomości od użytkowników (prywatne, tekst, nie komenda).
 Router powinien być rejestrowany NA KOŃCU, żeby łapać tylko wiadomości nieobsłużone przez inne handlery.
 """
+import asyncio
 import logging
 from aiogram import Router, F, Bot
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.filters import BaseFilter
 
 from config import settings
 from database.models import InboxMuted
@@ -13,6 +13,18 @@ from database.models import InboxMuted
 logger = logging.getLogger("handlers")
 inbox_router = Router(name="inbox")
 
+# Powiadomienia do adminów wysyłane w tle (handler nie czeka na RTT do Telegrama)
+_inbox_sem = asyncio.Semaphore(20)
+_inbox_tasks: set[asyncio.Task] = set()  # silne referencje do czasu zakończenia zadania
+
+# Szablon powiadomienia dla admina: user_id, @username, imię, podgląd treści
+_ADMIN_TEMPLATE = (
+    "📩 <b>Wiadomość od użytkownika</b>\n\n"
+    "👤 user_id: <code>%d</code>\n"
+    "📛 @%s | %s\n\n"
+    "💬 %s"
+)
+
 
 def _escape_html(s: str) -> str:
     """Escapuje znaki HTML (treść użytkownika)."""
@@ -26,15 +38,6 @@ def _escape_html(s: str) -> str:
     )
 
 
-class NotCommandFilter(BaseFilter):
-    """Wiadomość ma tekst i nie jest komendą (nie zaczyna się od /)."""
-
-    async def __call__(self, message: Message) -> bool:
-        if not message.text:
-            return False
-        return not message.text.strip().startswith("/")
-
-
 def _inbox_admin_ids() -> list:
     """ID wszystkich superadminów (główny admin + SUPERADMIN_IDS) – każdy dostaje powiadomienia inbox."""
     ids = [settings.ADMIN_ID]
@@ -42,41 +45,52 @@ def _inbox_admin_ids() -> list:
     return list(dict.fromkeys(ids))
 
 
-@inbox_router.message(F.chat.type == "private", F.text, NotCommandFilter())
+# Tekst z Telegrama nie ma wiodących białych znaków – wystarczy startswith bez strip()
+@inbox_router.message(
+    F.chat.type == "private",
+    F.text,
+    F.text.func(lambda t: not t.startswith("/")),
+)
 async def inbox_forward_to_admin(message: Message, bot: Bot):
     """
     Łapie prywatne wiadomości tekstowe, które nie są komendą (żaden wcześniejszy handler ich nie obsłużył).
     Przekazuje do wszystkich superadminów z przyciskami Odpowiedz / Wycisz (jeśli user nie jest wyciszony).
     """
-    if not message.text or not message.from_user:
+    # F.text w filtrze gwarantuje niepusty tekst
+    if not message.from_user:
         return
     user_id = message.from_user.id
     if settings.is_superadmin(user_id):
         return
+    # Zbiór wyciszonych w pamięci (InboxMuted.load_cache przy starcie) – bez zapytania do bazy
     if await InboxMuted.is_muted(user_id):
         return
     username = _escape_html((message.from_user.username or "—")[:30])
     full_name = _escape_html((message.from_user.full_name or "—")[:50])
-    text_preview = _escape_html((message.text or "")[:300])
-    if len(message.text or "") > 300:
+    text = message.text
+    text_preview = _escape_html(text[:300])
+    if len(text) > 300:
         text_preview += "..."
-    admin_text = (
-        "📩 <b>Wiadomość od użytkownika</b>\n\n"
-        f"👤 user_id: <code>{user_id}</code>\n"
-        f"📛 @{username} | {full_name}\n\n"
-        f"💬 {text_preview}"
-    )
+    admin_text = _ADMIN_TEMPLATE % (user_id, username, full_name, text_preview)
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="↩️ Odpowiedz", callback_data=f"inbox_reply_{user_id}")],
         [InlineKeyboardButton(text="🔇 Wycisz powiadomienia", callback_data=f"inbox_mute_{user_id}")],
     ])
     for admin_id in _inbox_admin_ids():
+        task = asyncio.create_task(_forward(bot, admin_id, admin_text, keyboard))
+        _inbox_tasks.add(task)
+        task.add_done_callback(_inbox_tasks.discard)
+
+
+async def _forward(bot: Bot, admin_id: int, admin_text: str, keyboard: InlineKeyboardMarkup) -> None:
+    """Wysłanie powiadomienia inbox do jednego admina (w tle, z limitem równoległości)."""
+    async with _inbox_sem:
         try:
             await bot.send_message(
                 admin_id,
                 admin_text,
                 reply_markup=keyboard,
-                parse_mode="HTML",
+                parse_mode="HTML",  # domyślny bota to MARKDOWN
             )
         except Exception as e:
             logger.warning("inbox forward to admin %s: %s", admin_id, e)
@@ -2,9 +2,9 @@
 Planowanie postów – wybór kanału, treść, przyciski, data publikacji.
 Limit zaplanowanych postów jest konfigurowalny per użytkownik (domyślnie 10).
 """
-import json
+import asyncio
 import logging
-from datetime import datetime
+from contextlib import asynccontextmanager
 
 from aiogram import Router, Bot, F
 from aiogram.types import (
@@ -16,7 +16,6 @@ from aiogram.types import (
 )
 from aiogram.enums import ParseMode
 from aiogram.fsm.context import FSMContext
-import html
 
 from database.models import (
     ChannelManager,
@@ -27,29 +26,16 @@ from utils.states import PostPlanning
 from utils.helpers import (
     parse_buttons_text,
     parse_datetime_from_text,
-    create_inline_keyboard_from_buttons,
 )
 from handlers.admin_posts import send_post_to_channel
 
 
-def _schedule_keyboard() -> InlineKeyboardMarkup:
-    """Klawiatura planowania (callbacki pp_* żeby nie kolidować z /newpost)."""
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📤 Wyślij teraz", callback_data=CB_SCHEDULE_NOW)],
-        [InlineKeyboardButton(text="⏰ Zaplanuj na później", callback_data=CB_SCHEDULE_LATER)],
-        [InlineKeyboardButton(text="❌ Anuluj", callback_data=CB_SCHEDULE_CANCEL)],
-    ])
-
-
-def _buttons_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="➕ Dodaj przyciski", callback_data=CB_BUTTONS_ADD)],
-        [InlineKeyboardButton(text="➡️ Pomiń przyciski", callback_data=CB_BUTTONS_SKIP)],
-        [InlineKeyboardButton(text="❌ Anuluj", callback_data=CB_BUTTONS_CANCEL)],
-    ])
-
 logger = logging.getLogger("handlers")
+# Domyślny parse_mode bota to MARKDOWN (bot.py, reszta handlerów na nim polega),
+# a planer renderuje HTML – dlatego parse_mode=ParseMode.HTML zostaje jawnie przy wywołaniach.
 post_planning_router = Router(name="post_planning")
+# Jeden test prefiksu na poziomie routera – callbacki spoza planera pomijają wszystkie handlery poniżej
+post_planning_router.callback_query.filter(F.data.startswith(("pp_", "post_planning_")))
 
 # Callback prefixy
 CB_CHANNEL = "pp_ch_"
@@ -65,40 +51,101 @@ CB_NEW_POST = "pp_new_post"
 CB_LIST_PAGE = "pp_list_page_"
 CB_DELETE = "pp_del_"
 POSTS_PER_PAGE = 5
+# Długości prefiksów – callback_data zawsze zaczyna się od prefiksu, wystarczy wycinek
+_CB_CHANNEL_LEN = len(CB_CHANNEL)
+_CB_DELETE_LEN = len(CB_DELETE)
+
+# Blokada per użytkownik: operacje jednego usera (wysyłka, zapis, usuwanie) idą po kolei,
+# różni userzy działają równolegle (np. dwa szybkie kliknięcia nie przekroczą limitu kolejki).
+# user_id -> [blokada, liczba trzymających/czekających]; wpis znika, gdy nikt już go nie używa
+_user_locks: dict[int, list] = {}
+
+# Etykiety typów treści na liście zaplanowanych postów
+_TYPE_LABELS = {"photo": "Zdjęcie", "video": "Wideo", "document": "Dokument", "sticker": "Sticker", "text": "Tekst"}
+
+# Tablica dla str.translate – jeden przebieg zamiast trzech replace (bez cudzysłowów, jak html.escape(quote=False))
+_HTML_ESCAPE_NOQUOTE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+
+@asynccontextmanager
+async def _user_lock(user_id: int):
+    """Blokada operacji jednego użytkownika; słownik trzyma tylko userów z trwającą operacją."""
+    entry = _user_locks.get(user_id)
+    if entry is None:
+        entry = _user_locks[user_id] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            _user_locks.pop(user_id, None)
 
 
 def _h(s: str) -> str:
     """Escape dla HTML (treść od użytkownika)."""
-    if not s:
-        return ""
-    return html.escape(str(s), quote=False)
+    return s.translate(_HTML_ESCAPE_NOQUOTE) if s else ""
 
 
-def _keyboard_back_to_channels() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="« Wstecz", callback_data=CB_BACK)]
-    ])
+def _fmt_short(d) -> str:
+    """DD.MM HH:MM bez strftime (samo pobranie atrybutów i format int)."""
+    return f"{d.day:02d}.{d.month:02d} {d.hour:02d}:{d.minute:02d}"
 
 
-def _keyboard_back_to_menu() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Do menu", callback_data="refresh_channels")]
-    ])
+def _fmt_full(d) -> str:
+    """DD.MM.YYYY HH:MM bez strftime."""
+    return f"{d.day:02d}.{d.month:02d}.{d.year} {d.hour:02d}:{d.minute:02d}"
+
+
+def _preview(p) -> str:
+    """Krótki podgląd posta na liście (max 50 znaków + …)."""
+    src = p.content if p.content_type == "text" and p.content else p.caption
+    if not src:
+        return _TYPE_LABELS.get(p.content_type, p.content_type)
+    head = src[:51]
+    return head[:50] + "…" if len(head) > 50 else head
+
+
+# ——— Statyczne klawiatury: budowane raz przy imporcie, ta sama instancja przy każdym wysłaniu ———
+
+# Klawiatura planowania (callbacki pp_* żeby nie kolidować z /newpost)
+_KB_SCHEDULE = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📤 Wyślij teraz", callback_data=CB_SCHEDULE_NOW)],
+    [InlineKeyboardButton(text="⏰ Zaplanuj na później", callback_data=CB_SCHEDULE_LATER)],
+    [InlineKeyboardButton(text="❌ Anuluj", callback_data=CB_SCHEDULE_CANCEL)],
+])
+
+_KB_BUTTONS = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="➕ Dodaj przyciski", callback_data=CB_BUTTONS_ADD)],
+    [InlineKeyboardButton(text="➡️ Pomiń przyciski", callback_data=CB_BUTTONS_SKIP)],
+    [InlineKeyboardButton(text="❌ Anuluj", callback_data=CB_BUTTONS_CANCEL)],
+])
+
+_BACK_BUTTON = InlineKeyboardButton(text="« Wstecz", callback_data=CB_BACK)
+
+_KB_BACK_TO_CHANNELS = InlineKeyboardMarkup(inline_keyboard=[[_BACK_BUTTON]])
+
+_KB_PLANER_MENU = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="➕ Nowy post", callback_data=CB_NEW_POST)],
+    [InlineKeyboardButton(text="📋 Zaplanowane posty", callback_data=CB_LIST)],
+    [InlineKeyboardButton(text="🔙 Menu", callback_data="refresh_channels")],
+])
+
+_KB_EMPTY_LIST = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="➕ Nowy post", callback_data=CB_NEW_POST)],
+    [InlineKeyboardButton(text="🔙 Planer postów", callback_data="post_planning_start")],
+])
 
 
 # ——— Wejście: menu planera (Nowy post / Zaplanowane posty) ———
 
 async def _show_planer_menu(callback: CallbackQuery):
     """Pokazuje menu planera: Nowy post, Zaplanowane posty, Menu."""
-    keyboard = [
-        [InlineKeyboardButton(text="➕ Nowy post", callback_data=CB_NEW_POST)],
-        [InlineKeyboardButton(text="📋 Zaplanowane posty", callback_data=CB_LIST)],
-        [InlineKeyboardButton(text="🔙 Menu", callback_data="refresh_channels")],
-    ]
     await callback.message.edit_text(
         "📅 <b>Planer postów</b>\n\n"
         "Tu zaplanujesz publikacje na wybrany kanał. Limit to max postów <b>w kolejce jednocześnie</b> — po publikacji lub usunięciu miejsce się zwalnia.",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
+        reply_markup=_KB_PLANER_MENU,
         parse_mode=ParseMode.HTML,
     )
 
@@ -127,16 +174,14 @@ async def post_planning_new_post(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
 
-    keyboard = []
-    for ch in channels:
-        emoji = "💎" if ch["type"] == "premium" else "🆓"
-        keyboard.append([
-            InlineKeyboardButton(
-                text=f"{emoji} {ch['title'].upper()}",
-                callback_data=f"{CB_CHANNEL}{ch['channel_id']}",
-            )
-        ])
-    keyboard.append([InlineKeyboardButton(text="« Wstecz", callback_data=CB_BACK)])
+    keyboard = [
+        [InlineKeyboardButton(
+            text=f"{'💎' if ch['type'] == 'premium' else '🆓'} {ch['title'].upper()}",
+            callback_data=f"{CB_CHANNEL}{ch['channel_id']}",
+        )]
+        for ch in channels
+    ]
+    keyboard.append([_BACK_BUTTON])
 
     await callback.message.edit_text(
         "📅 <b>Planer postów</b> → Nowy post\n\n"
@@ -161,7 +206,7 @@ async def post_planning_channel_selected(callback: CallbackQuery, state: FSMCont
     """Wybrano kanał – prośba o treść posta."""
     try:
         # Telegram channel_id jest ujemny (np. -1001234567890) – wymuszamy int
-        channel_id = int(callback.data.replace(CB_CHANNEL, "").strip())
+        channel_id = int(callback.data[_CB_CHANNEL_LEN:])
         user_id = callback.from_user.id
         if not await ChannelManager.is_owner(user_id, channel_id):
             await callback.answer("❌ To nie Twój kanał.", show_alert=True)
@@ -180,7 +225,7 @@ async def post_planning_channel_selected(callback: CallbackQuery, state: FSMCont
             f"✅ Kanał: <b>{_h(title)}</b>\n\n"
             "Wyślij treść posta: tekst, zdjęcie, wideo lub sticker. "
             "Możesz wysłać jedną wiadomość lub kilka.",
-            reply_markup=_keyboard_back_to_channels(),
+            reply_markup=_KB_BACK_TO_CHANNELS,
             parse_mode=ParseMode.HTML,
         )
         await callback.answer()
@@ -245,7 +290,7 @@ async def post_planning_content_received(message: Message, state: FSMContext):
         await message.reply(
             "✅ Treść zapisana.\n\n"
             "🔘 Chcesz dodać przyciski (URL) do posta?",
-            reply_markup=_buttons_keyboard(),
+            reply_markup=_KB_BUTTONS,
         )
     except Exception as e:
         logger.error(f"post_planning content: {e}")
@@ -280,7 +325,7 @@ async def post_planning_buttons_skip(callback: CallbackQuery, state: FSMContext)
     await callback.message.edit_text(
         "⏰ <b>Planowanie publikacji</b>\n\n"
         "Kiedy opublikować post?",
-        reply_markup=_schedule_keyboard(),
+        reply_markup=_KB_SCHEDULE,
     )
     await state.set_state(PostPlanning.waiting_schedule)
     await callback.answer()
@@ -311,11 +356,11 @@ async def post_planning_buttons_text(message: Message, state: FSMContext):
         )
         return
     await state.update_data(buttons=buttons)
-    buttons_preview = "\n".join([f"• {_h(b['text'])} → {_h(b['url'])}" for b in buttons])
+    buttons_preview = "\n".join(f"• {_h(b['text'])} → {_h(b['url'])}" for b in buttons)
     await message.reply(
         f"✅ <b>Przyciski dodane:</b>\n\n{buttons_preview}\n\n"
         "⏰ Kiedy opublikować post?",
-        reply_markup=_schedule_keyboard(),
+        reply_markup=_KB_SCHEDULE,
         parse_mode=ParseMode.HTML,
     )
     await state.set_state(PostPlanning.waiting_schedule)
@@ -326,32 +371,33 @@ async def post_planning_buttons_text(message: Message, state: FSMContext):
 @post_planning_router.callback_query(F.data == CB_SCHEDULE_NOW, PostPlanning.waiting_schedule)
 async def post_planning_send_now(callback: CallbackQuery, state: FSMContext, bot: Bot):
     """Wysłanie posta natychmiast."""
+    user_id = callback.from_user.id
     try:
-        data = await state.get_data()
-        user_id = callback.from_user.id
-        channel_id = data.get("planning_channel_id")
-        post_data = {
-            "content_type": data["content_type"],
-            "content": data["content"],
-            "caption": data.get("caption"),
-            "buttons": data.get("buttons"),
-        }
-        success = await send_post_to_channel(bot, post_data, user_id, channel_id=channel_id)
-        if success:
-            await callback.message.edit_text(
-                "✅ <b>Post opublikowany.</b>",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [
-                        InlineKeyboardButton(text="🔙 Dashboard", callback_data="refresh_channels"),
-                        InlineKeyboardButton(text="➕ Zaplanuj kolejny", callback_data="post_planning_start"),
-                    ],
-                ]),
-                parse_mode=ParseMode.HTML,
-            )
-        else:
-            await callback.message.edit_text("❌ Błąd publikacji. Sprawdź uprawnienia bota na kanale.")
-        await state.clear()
-        await callback.answer()
+        async with _user_lock(user_id):
+            data = await state.get_data()
+            channel_id = data.get("planning_channel_id")
+            post_data = {
+                "content_type": data["content_type"],
+                "content": data["content"],
+                "caption": data.get("caption"),
+                "buttons": data.get("buttons"),
+            }
+            success = await send_post_to_channel(bot, post_data, user_id, channel_id=channel_id)
+            if success:
+                await callback.message.edit_text(
+                    "✅ <b>Post opublikowany.</b>",
+                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                        [
+                            InlineKeyboardButton(text="🔙 Dashboard", callback_data="refresh_channels"),
+                            InlineKeyboardButton(text="➕ Zaplanuj kolejny", callback_data="post_planning_start"),
+                        ],
+                    ]),
+                    parse_mode=ParseMode.HTML,
+                )
+            else:
+                await callback.message.edit_text("❌ Błąd publikacji. Sprawdź uprawnienia bota na kanale.")
+            await state.clear()
+            await callback.answer()
     except Exception as e:
         logger.error(f"post_planning send now: {e}")
         await callback.answer("Błąd.", show_alert=True)
@@ -394,46 +440,47 @@ async def post_planning_schedule_date(message: Message, state: FSMContext):
         return
 
     user_id = message.from_user.id
-    data = await state.get_data()
-    channel_id = data.get("planning_channel_id")
-    max_posts = await SettingsManager.get_max_scheduled_posts(user_id)
-    current_count = await PostManager.count_pending_posts(user_id)
+    async with _user_lock(user_id):
+        data = await state.get_data()
+        channel_id = data.get("planning_channel_id")
+        max_posts = await SettingsManager.get_max_scheduled_posts(user_id)
+        current_count = await PostManager.count_pending_posts(user_id)
 
-    if current_count >= max_posts:
-        await message.reply(
-            f"❌ Masz już maksymalną liczbę postów w kolejce ({max_posts}).\n\n"
-            "Limit to liczba postów zaplanowanych <b>jednocześnie</b>. "
-            "Usuń któryś z listy lub poczekaj, aż się opublikuje – wtedy zwolni się miejsce.",
-            parse_mode=ParseMode.HTML,
-        )
-        return
+        if current_count >= max_posts:
+            await message.reply(
+                f"❌ Masz już maksymalną liczbę postów w kolejce ({max_posts}).\n\n"
+                "Limit to liczba postów zaplanowanych <b>jednocześnie</b>. "
+                "Usuń któryś z listy lub poczekaj, aż się opublikuje – wtedy zwolni się miejsce.",
+                parse_mode=ParseMode.HTML,
+            )
+            return
 
-    post_id = await PostManager.create_scheduled_post(
-        owner_id=user_id,
-        channel_id=int(channel_id),
-        content_type=data["content_type"],
-        content=data["content"],
-        publish_date=publish_date,
-        caption=data.get("caption"),
-        buttons=data.get("buttons"),
-    )
-    if post_id:
-        await message.reply(
-            f"✅ <b>Post zaplanowany</b>\n\n"
-            f"📅 Publikacja: {publish_date.strftime('%d.%m.%Y %H:%M')}\n"
-            f"📝 Typ: {data['content_type']}\n\n"
-            f"W kolejce: <b>{current_count + 1} / {max_posts}</b> postów <i>(limit = max jednocześnie; po publikacji lub usunięciu miejsce się zwalnia)</i>",
-            parse_mode=ParseMode.HTML,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [
-                    InlineKeyboardButton(text="🔙 Dashboard", callback_data="refresh_channels"),
-                    InlineKeyboardButton(text="➕ Zaplanuj kolejny", callback_data="post_planning_start"),
-                ],
-            ]),
+        post_id = await PostManager.create_scheduled_post(
+            owner_id=user_id,
+            channel_id=int(channel_id),
+            content_type=data["content_type"],
+            content=data["content"],
+            publish_date=publish_date,
+            caption=data.get("caption"),
+            buttons=data.get("buttons"),
         )
-    else:
-        await message.reply("❌ Błąd zapisu zaplanowanego posta.")
-    await state.clear()
+        if post_id:
+            await message.reply(
+                f"✅ <b>Post zaplanowany</b>\n\n"
+                f"📅 Publikacja: {_fmt_full(publish_date)}\n"
+                f"📝 Typ: {data['content_type']}\n\n"
+                f"W kolejce: <b>{current_count + 1} / {max_posts}</b> postów <i>(limit = max jednocześnie; po publikacji lub usunięciu miejsce się zwalnia)</i>",
+                parse_mode=ParseMode.HTML,
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                    [
+                        InlineKeyboardButton(text="🔙 Dashboard", callback_data="refresh_channels"),
+                        InlineKeyboardButton(text="➕ Zaplanuj kolejny", callback_data="post_planning_start"),
+                    ],
+                ]),
+            )
+        else:
+            await message.reply("❌ Błąd zapisu zaplanowanego posta.")
+        await state.clear()
 
 
 # ——— Lista zaplanowanych i ustawienia ———
@@ -445,37 +492,31 @@ async def post_planning_list(callback: CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
     posts = await PostManager.get_scheduled_posts(user_id)
     max_posts = await SettingsManager.get_max_scheduled_posts(user_id)
+    await _render_post_list(callback, posts, max_posts)
+    await callback.answer()
+
 
+async def _render_post_list(callback: CallbackQuery, posts: list, max_posts: int):
+    """Renderuje listę zaplanowanych postów (bez callback.answer – robi to wywołujący)."""
     if not posts:
         await callback.message.edit_text(
             "📋 <b>Zaplanowane posty</b>\n\n"
             "Brak postów w kolejce.\n\n"
             f"<i>Limit: do <b>{max_posts}</b> postów jednocześnie. Po publikacji lub usunięciu miejsce się zwalnia.</i>",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="➕ Nowy post", callback_data=CB_NEW_POST)],
-                [InlineKeyboardButton(text="🔙 Planer postów", callback_data="post_planning_start")],
-            ]),
+            reply_markup=_KB_EMPTY_LIST,
             parse_mode=ParseMode.HTML,
         )
-        await callback.answer()
         return
 
     page = 0
     total_pages = (len(posts) + POSTS_PER_PAGE - 1) // POSTS_PER_PAGE
     chunk = posts[page * POSTS_PER_PAGE : (page + 1) * POSTS_PER_PAGE]
-    type_lbl = {"photo": "Zdjęcie", "video": "Wideo", "document": "Dokument", "sticker": "Sticker", "text": "Tekst"}
-    lines = []
-    for p in chunk:
-        if p.content_type == "text" and p.content:
-            preview = (p.content[:50] + "…") if len(p.content) > 50 else p.content
-        elif p.caption:
-            preview = (p.caption[:50] + "…") if len(p.caption) > 50 else p.caption
-        else:
-            preview = type_lbl.get(p.content_type, p.content_type)
-        lines.append(f"• <b>{p.publish_date.strftime('%d.%m %H:%M')}</b> — {_h(preview)}")
     text = (
         f"📋 <b>Zaplanowane posty</b> — w kolejce: <b>{len(posts)} / {max_posts}</b>\n\n"
-        + "\n".join(lines)
+        + "\n".join(
+            f"• <b>{_fmt_short(p.publish_date)}</b> — {_h(_preview(p))}"
+            for p in chunk
+        )
     )
     keyboard = []
     for p in chunk:
@@ -495,23 +536,22 @@ async def post_planning_list(callback: CallbackQuery, state: FSMContext):
         reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
         parse_mode=ParseMode.HTML,
     )
-    await callback.answer()
 
 
 @post_planning_router.callback_query(F.data.startswith(CB_DELETE))
 async def post_planning_delete(callback: CallbackQuery, state: FSMContext):
     """Usunięcie zaplanowanego posta."""
     try:
-        post_id = int(callback.data.replace(CB_DELETE, ""))
+        post_id = int(callback.data[_CB_DELETE_LEN:])
         user_id = callback.from_user.id
-        post = await PostManager.get_post_by_id(post_id, owner_id=user_id)
-        if not post:
+        async with _user_lock(user_id):
+            deleted, posts, max_posts = await PostManager.delete_and_list(user_id, post_id)
+        if not deleted:
             await callback.answer("❌ Nie znaleziono posta.", show_alert=True)
             return
-        await PostManager.delete_post(post_id)
+        await state.clear()
         await callback.answer("✅ Post usunięty.", show_alert=True)
-        callback.data = CB_LIST
-        await post_planning_list(callback, state)
+        await _render_post_list(callback, posts, max_posts)
     except Exception as e:
         logger.error(f"post_planning delete: {e}")
         await callback.answer("Błąd.", show_alert=True)
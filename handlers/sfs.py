@@ -4,55 +4,252 @@ Statystyka: subów (members_count). Odświeżenie = podbicie ogłoszenia (max 1/
 Reputacja po owner_id – nie resetuje się przy usunięciu ogłoszenia.
 """
 import asyncio
-import html
 import logging
+import time
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Optional
 
 from aiogram import Router, Bot, F
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, Message
 from aiogram.enums import ParseMode
 from aiogram.fsm.context import FSMContext
+from aiogram.filters.callback_data import CallbackData
 
 from database.models import ChannelManager, SFSManager
 
 logger = logging.getLogger("handlers")
 sfs_router = Router(name="sfs")
 
-SFS_LIST_PAGE_PREFIX = "sfs_list_page_"
 SFS_JOIN_CONFIRM = "sfs_join_confirm"
 SFS_LEAVE = "sfs_leave"
 PER_PAGE = 10
 MIN_SUBS_TO_RATE = 100
 
 
+class SfsPage(CallbackData, prefix="sfs_list_page"):
+    """Strona listy SFS (parsowana przez aiogram przy dopasowaniu filtra)."""
+    page: int
+
+
+class SfsRate(CallbackData, prefix="sfs_rate"):
+    """Łapka dla ogłoszenia owner_id (up=True → 👍, False → 👎)."""
+    owner_id: int
+    up: bool
+
+
+_SFS_LIST_FIRST = SfsPage(page=0).pack()
+
+# Statyczne przyciski i klawiatury – budowane raz przy imporcie
+_LIST_BTN = InlineKeyboardButton(text="📋 Lista SFS", callback_data=_SFS_LIST_FIRST)
+_REFRESH_BTN = InlineKeyboardButton(text="🔄 Odśwież ogłoszenie (podbicie)", callback_data="sfs_refresh")
+_LEAVE_BTN = InlineKeyboardButton(text="🚪 Usuń z SFS", callback_data=SFS_LEAVE)
+_REGISTER_BTN = InlineKeyboardButton(text="📢 Zgłoś się do SFS", callback_data="sfs_register")
+_BACK_TO_MENU_BTN = InlineKeyboardButton(text="🔙 Powrót do menu", callback_data="refresh_channels")
+_BACK_TO_SFS_BTN = InlineKeyboardButton(text="🔙 Powrót do menu SFS", callback_data="sfs_start")
+
+# Ekran główny: z ogłoszeniem / z kanałem free (można się zgłosić) / bez kanału free
+_MAIN_KB_LISTED = InlineKeyboardMarkup(inline_keyboard=[[_LIST_BTN], [_REFRESH_BTN], [_LEAVE_BTN], [_BACK_TO_MENU_BTN]])
+_MAIN_KB_CAN_REGISTER = InlineKeyboardMarkup(inline_keyboard=[[_LIST_BTN], [_REGISTER_BTN], [_BACK_TO_MENU_BTN]])
+_MAIN_KB_NO_FREE = InlineKeyboardMarkup(inline_keyboard=[[_LIST_BTN], [_BACK_TO_MENU_BTN]])
+
+_NO_FREE_CHANNEL_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🔙 Powrót", callback_data="sfs_start")],
+])
+_LISTED_KB = InlineKeyboardMarkup(inline_keyboard=[[_REFRESH_BTN], [_LEAVE_BTN], [_BACK_TO_SFS_BTN]])
+_LISTED_REFRESHED_KB = InlineKeyboardMarkup(inline_keyboard=[[_LEAVE_BTN], [_BACK_TO_SFS_BTN]])
+_JOIN_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="✅ Dołącz", callback_data=SFS_JOIN_CONFIRM)],
+    [InlineKeyboardButton(text="🔙 Wróć do menu SFS", callback_data="sfs_start")],
+])
+_JOINED_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [_LIST_BTN],
+    [InlineKeyboardButton(text="🔙 Menu SFS", callback_data="sfs_start")],
+])
+_EMPTY_LIST_KB = InlineKeyboardMarkup(inline_keyboard=[[_BACK_TO_SFS_BTN]])
+
+# Cache liczby wpisów SFS (COUNT(*) przy każdym kliknięciu) – TTL w sekundach, reset przy dołączeniu/usunięciu
+_TOTAL_TTL = 10.0
+_total_cache = {"v": 0, "t": 0.0}
+
+
+async def _cached_total() -> int:
+    """Liczba wpisów SFS z krótkim cache w pamięci."""
+    now = time.monotonic()
+    if _total_cache["t"] and now - _total_cache["t"] < _TOTAL_TTL:
+        return _total_cache["v"]
+    v = await SFSManager.get_listings_total()
+    _total_cache.update(v=v, t=now)
+    return v
+
+
+def _invalidate_total() -> None:
+    _total_cache["t"] = 0.0
+
+
+def _adjust_total(delta: int) -> None:
+    """Korekta cache liczby wpisów o znaną zmianę (bez ponownego COUNT); pusty cache zostaje pusty."""
+    if _total_cache["t"]:
+        _total_cache["v"] = max(0, _total_cache["v"] + delta)
+
+
+# Łapki zbierane w pamięci i zapisywane paczką co _RATE_FLUSH_INTERVAL s: (owner_id, rater_id) -> vote.
+# Ponowny głos tego samego usera przed zapisem nadpisuje poprzedni (jeden wiersz w paczce).
+_RATE_FLUSH_INTERVAL = 2.0
+_pending_votes: dict[tuple[int, int], int] = {}
+_inflight_votes: dict[tuple[int, int], int] = {}
+_rate_flusher_task: Optional[asyncio.Task] = None
+_rate_flusher_stop = asyncio.Event()
+
+
+async def flush_pending_ratings() -> None:
+    """Zapis zebranych łapek jednym zapytaniem; przy błędzie wracają do kolejki."""
+    global _pending_votes, _inflight_votes
+    if not _pending_votes:
+        return
+    _inflight_votes, _pending_votes = _pending_votes, {}
+    batch = [(owner_id, rater_id, vote) for (owner_id, rater_id), vote in _inflight_votes.items()]
+    ok = False
+    try:
+        ok = await SFSManager.bulk_set_rating(batch)
+    finally:
+        # Także przy wyjątku / anulowaniu – paczka wraca do kolejki zamiast przepaść
+        if not ok:
+            for key, vote in _inflight_votes.items():
+                _pending_votes.setdefault(key, vote)
+        _inflight_votes = {}
+
+
+async def _rate_flusher() -> None:
+    # Pętla kończy się po _rate_flusher_stop (bez cancel) – trwający zapis dobiega końca, potem ostatni flush
+    while not _rate_flusher_stop.is_set():
+        try:
+            await asyncio.wait_for(_rate_flusher_stop.wait(), timeout=_RATE_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await flush_pending_ratings()
+        except Exception as e:
+            logger.warning("SFS rate flusher: %s", e)
+
+
+def start_rate_flusher() -> None:
+    """Start zadania zapisującego łapki w tle (wywoływane przy starcie bota)."""
+    global _rate_flusher_task
+    if _rate_flusher_task is None or _rate_flusher_task.done():
+        _rate_flusher_stop.clear()
+        _rate_flusher_task = asyncio.create_task(_rate_flusher())
+
+
+async def stop_rate_flusher() -> None:
+    """Zatrzymanie zadania i zapis pozostałych łapek (przed zamknięciem bazy)."""
+    global _rate_flusher_task
+    if _rate_flusher_task is not None:
+        _rate_flusher_stop.set()
+        await _rate_flusher_task
+        _rate_flusher_task = None
+    else:
+        await flush_pending_ratings()
+
+
+async def _rating_counts_with_pending(owner_id: int, extra: Optional[dict[int, int]] = None) -> tuple:
+    """
+    (up, down) z bazy + głosy jeszcze niezapisane (nadpisują zapisany głos tego samego usera).
+    extra – dodatkowe głosy {rater_id: vote} liczone tak, jakby już czekały na zapis.
+    """
+    unsaved = {**_inflight_votes, **_pending_votes}
+    votes = {rater: vote for (owner, rater), vote in unsaved.items() if owner == owner_id}
+    if extra:
+        votes.update(extra)
+    up, down = await SFSManager.get_rating_counts(owner_id, exclude_raters=list(votes))
+    for vote in votes.values():
+        if vote == 1:
+            up += 1
+        else:
+            down += 1
+    return up, down
+
+
+# Cache liczby subów per kanał: channel_id -> (monotonic, members_count)
+_MEMBER_COUNT_TTL = 60.0
+_member_count_cache: dict[int, tuple[float, int]] = {}
+
+
+async def _get_member_count(bot: Bot, channel_id: int, default: int = 0) -> int:
+    """get_chat_member_count z cache (TTL 60 s); przy błędzie – ostatnia znana wartość lub default."""
+    now = time.monotonic()
+    hit = _member_count_cache.get(channel_id)
+    if hit and now - hit[0] < _MEMBER_COUNT_TTL:
+        return hit[1]
+    try:
+        value = await bot.get_chat_member_count(chat_id=channel_id)
+    except Exception as e:
+        logger.warning("SFS get_chat_member_count channel_id=%s: %s", channel_id, e)
+        return hit[1] if hit else default
+    _member_count_cache[channel_id] = (now, value)
+    return value
+
+
+# Tablica dla str.translate – jeden przebieg zamiast trzech replace (jak html.escape(quote=False))
+_HTML_ESCAPE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+
 def _h(s: str) -> str:
     """Escape dla HTML (treść od użytkownika)."""
-    if not s:
-        return ""
-    return html.escape(str(s), quote=False)
+    return s.translate(_HTML_ESCAPE) if s else ""
 
 
 def _format_refreshed_at(dt_str) -> str:
     """Format refreshed_at / created_at jako DD.MM HH:MM."""
     if not dt_str:
         return "—"
+    if isinstance(dt_str, str):
+        return _format_refreshed_at_str(dt_str)
     try:
-        if isinstance(dt_str, str):
-            dt = datetime.fromisoformat(dt_str.replace("Z", "+00:00")[:19])
-        else:
-            dt = dt_str
+        return dt_str.strftime("%d.%m %H:%M")
+    except Exception:
+        return "—"
+
+
+@lru_cache(maxsize=4096)
+def _format_refreshed_at_str(dt_str: str) -> str:
+    """Parsowanie ISO z SQLite – ten sam string przy każdym renderze listy, więc wynik w cache."""
+    try:
+        dt = datetime.fromisoformat(dt_str.replace("Z", "+00:00")[:19])
         return dt.strftime("%d.%m %H:%M")
     except Exception:
         return "—"
 
 
-async def _get_sfs_main_content(user_id: int):
-    """Tekst i klawiatura ekranu głównego SFS."""
-    count = await SFSManager.count_listings()
-    channels = await ChannelManager.get_user_channels(user_id)
+async def _delete_list_messages(bot: Bot, chat_id: int, message_ids: list) -> None:
+    """Usuwa wiadomości listy SFS jednym deleteMessages (po 100 ID); przy błędzie – pojedynczo."""
+    for i in range(0, len(message_ids), 100):
+        batch = message_ids[i:i + 100]
+        try:
+            await bot.delete_messages(chat_id=chat_id, message_ids=batch)
+        except Exception:
+            for mid in batch:
+                try:
+                    await bot.delete_message(chat_id=chat_id, message_id=mid)
+                except Exception:
+                    pass
+
+
+async def _get_sfs_main_content(user_id: int, has_listing: Optional[bool] = None):
+    """Tekst i klawiatura ekranu głównego SFS. has_listing – znany stan wpisu (pomija zapytanie)."""
+    if has_listing is None:
+        count, channels, listing = await asyncio.gather(
+            _cached_total(),
+            ChannelManager.get_user_channels_cached(user_id),
+            SFSManager.get_listing_by_owner(user_id),
+        )
+    else:
+        count, channels = await asyncio.gather(
+            _cached_total(),
+            ChannelManager.get_user_channels_cached(user_id),
+        )
+        listing = has_listing
     free_channels = [ch for ch in channels if ch.get("type") == "free"]
-    listing = await SFSManager.get_listing_by_owner(user_id)
 
     text = (
         "📢 <b>SFS System</b> (Shoutout for Shoutout)\n\n"
@@ -61,22 +258,19 @@ async def _get_sfs_main_content(user_id: int):
         f"<b>Aktualnie w SFS:</b> {count} użytkowników"
     )
 
-    keyboard = []
-    keyboard.append([InlineKeyboardButton(text="📋 Lista SFS", callback_data="sfs_list_page_0")])
     if listing:
-        keyboard.append([InlineKeyboardButton(text="🔄 Odśwież ogłoszenie (podbicie)", callback_data="sfs_refresh")])
-        keyboard.append([InlineKeyboardButton(text="🚪 Usuń z SFS", callback_data=SFS_LEAVE)])
+        keyboard = _MAIN_KB_LISTED
     elif free_channels:
-        keyboard.append([InlineKeyboardButton(text="📢 Zgłoś się do SFS", callback_data="sfs_register")])
-    keyboard.append([InlineKeyboardButton(text="🔙 Powrót do menu", callback_data="refresh_channels")])
-
-    return text, InlineKeyboardMarkup(inline_keyboard=keyboard)
+        keyboard = _MAIN_KB_CAN_REGISTER
+    else:
+        keyboard = _MAIN_KB_NO_FREE
+    return text, keyboard
 
 
-async def _show_sfs_main(callback: CallbackQuery):
+async def _show_sfs_main(callback: CallbackQuery, has_listing: Optional[bool] = None):
     """Ekran główny SFS: opis, statystyka, przyciski."""
     user_id = callback.from_user.id
-    text, keyboard = await _get_sfs_main_content(user_id)
+    text, keyboard = await _get_sfs_main_content(user_id, has_listing)
     await callback.message.edit_text(text, reply_markup=keyboard, parse_mode=ParseMode.HTML)
 
 
@@ -87,12 +281,7 @@ async def sfs_start(callback: CallbackQuery, state: FSMContext, bot: Bot):
     msg_ids = data.get("sfs_list_message_ids") or []
     chat_id = callback.message.chat.id
     current_id = callback.message.message_id
-    for mid in msg_ids:
-        if mid != current_id:
-            try:
-                await bot.delete_message(chat_id=chat_id, message_id=mid)
-            except Exception:
-                pass
+    await _delete_list_messages(bot, chat_id, [mid for mid in msg_ids if mid != current_id])
     await state.update_data(sfs_list_message_ids=[], sfs_list_page=0)
     await _show_sfs_main(callback)
     await callback.answer()
@@ -102,34 +291,27 @@ async def sfs_start(callback: CallbackQuery, state: FSMContext, bot: Bot):
 async def sfs_register(callback: CallbackQuery, bot: Bot):
     """Ekran zgłoszenia: dane kanału free, Dołącz / Odśwież (jeśli już w SFS)."""
     user_id = callback.from_user.id
-    channels = await ChannelManager.get_user_channels(user_id)
-    free_channels = [ch for ch in channels if ch.get("type") == "free"]
+    channel = await ChannelManager.get_user_free_channel(user_id)
 
-    if not free_channels:
+    if not channel:
         await callback.message.edit_text(
             "❌ Nie masz kanału typu Free. Dodaj kanał Free, żeby móc się zgłosić do SFS.",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔙 Powrót", callback_data="sfs_start")],
-            ]),
+            reply_markup=_NO_FREE_CHANNEL_KB,
             parse_mode=ParseMode.HTML,
         )
         await callback.answer()
         return
 
-    channel = free_channels[0]
     channel_id = channel["channel_id"]
     channel_title = channel.get("title") or "Kanał"
     username = callback.from_user.username or ""
     if username and not username.startswith("@"):
         username = "@" + username
 
-    members_count = 0
-    try:
-        members_count = await bot.get_chat_member_count(chat_id=channel_id)
-    except Exception as e:
-        logger.warning("SFS get_chat_member_count: %s", e)
-
-    existing = await SFSManager.get_listing_by_owner(user_id)
+    members_count, existing = await asyncio.gather(
+        _get_member_count(bot, channel_id),
+        SFSManager.get_listing_by_owner(user_id),
+    )
     if existing:
         ref_date = _format_refreshed_at(existing.get("refreshed_at"))
         can_refresh = not await SFSManager.was_refreshed_today(user_id)
@@ -139,14 +321,9 @@ async def sfs_register(callback: CallbackQuery, bot: Bot):
             "Ogłoszenie możesz odświeżyć <b>max raz dziennie</b> – wtedy wróci na górę listy.\n\n"
             "Możesz też usunąć się z SFS (Twoja reputacja – łapki – zostanie zachowana)."
         )
-        keyboard = []
-        if can_refresh:
-            keyboard.append([InlineKeyboardButton(text="🔄 Odśwież ogłoszenie (podbicie)", callback_data="sfs_refresh")])
-        keyboard.append([InlineKeyboardButton(text="🚪 Usuń z SFS", callback_data=SFS_LEAVE)])
-        keyboard.append([InlineKeyboardButton(text="🔙 Powrót do menu SFS", callback_data="sfs_start")])
         await callback.message.edit_text(
             text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
+            reply_markup=_LISTED_KB if can_refresh else _LISTED_REFRESHED_KB,
             parse_mode=ParseMode.HTML,
         )
         await callback.answer()
@@ -158,13 +335,9 @@ async def sfs_register(callback: CallbackQuery, bot: Bot):
         "Po kliknięciu <b>Dołącz</b> zostaniesz dodany na listę SFS z tą liczbą subów. "
         "Odświeżenie ogłoszenia (max raz dziennie) podbije je na górę listy."
     )
-    keyboard = [
-        [InlineKeyboardButton(text="✅ Dołącz", callback_data=SFS_JOIN_CONFIRM)],
-        [InlineKeyboardButton(text="🔙 Wróć do menu SFS", callback_data="sfs_start")],
-    ]
     await callback.message.edit_text(
         text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
+        reply_markup=_JOIN_KB,
         parse_mode=ParseMode.HTML,
     )
     await callback.answer()
@@ -174,24 +347,18 @@ async def sfs_register(callback: CallbackQuery, bot: Bot):
 async def sfs_join_confirm(callback: CallbackQuery, bot: Bot):
     """Dołącz – tworzenie wpisu SFS z subami, od razu na listę."""
     user_id = callback.from_user.id
-    channels = await ChannelManager.get_user_channels(user_id)
-    free_channels = [ch for ch in channels if ch.get("type") == "free"]
-    if not free_channels:
+    channel = await ChannelManager.get_user_free_channel(user_id)
+    if not channel:
         await callback.answer("Brak kanału Free.", show_alert=True)
         return
 
-    channel = free_channels[0]
     channel_id = channel["channel_id"]
     channel_title = channel.get("title") or "Kanał"
     username = callback.from_user.username or ""
     if username and not username.startswith("@"):
         username = "@" + username
 
-    members_count = 0
-    try:
-        members_count = await bot.get_chat_member_count(chat_id=channel_id)
-    except Exception as e:
-        logger.warning("SFS get_chat_member_count (join): %s", e)
+    members_count = await _get_member_count(bot, channel_id)
 
     ok = await SFSManager.create_listing(
         owner_id=user_id,
@@ -204,13 +371,11 @@ async def sfs_join_confirm(callback: CallbackQuery, bot: Bot):
     if not ok:
         await callback.answer("Błąd zapisu. Spróbuj ponownie.", show_alert=True)
         return
+    _invalidate_total()
 
     await callback.message.edit_text(
         "✅ <b>Dodano do listy SFS</b>\n\nTwoje ogłoszenie jest na liście (subów: " + str(members_count) + ").",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="📋 Lista SFS", callback_data="sfs_list_page_0")],
-            [InlineKeyboardButton(text="🔙 Menu SFS", callback_data="sfs_start")],
-        ]),
+        reply_markup=_JOINED_KB,
         parse_mode=ParseMode.HTML,
     )
     await callback.answer()
@@ -222,32 +387,33 @@ async def sfs_leave(callback: CallbackQuery):
     user_id = callback.from_user.id
     ok = await SFSManager.delete_listing(user_id)
     if ok:
+        _adjust_total(-1)
         await callback.answer("Usunięto z SFS. Twoja reputacja (łapki) została zachowana.", show_alert=True)
     else:
         await callback.answer("Nie jesteś na liście SFS.", show_alert=True)
-    await _show_sfs_main(callback)
+    # Po usunięciu (lub gdy wpisu nie było) user na pewno nie ma ogłoszenia
+    await _show_sfs_main(callback, has_listing=False)
 
 
 @sfs_router.callback_query(F.data == "sfs_refresh")
 async def sfs_refresh(callback: CallbackQuery, bot: Bot):
     """Odświeżenie (podbicie) ogłoszenia – max raz dziennie."""
     user_id = callback.from_user.id
-    if await SFSManager.was_refreshed_today(user_id):
+    refreshed_today, listing = await asyncio.gather(
+        SFSManager.was_refreshed_today(user_id),
+        SFSManager.get_listing_by_owner(user_id),
+    )
+    if refreshed_today:
         await callback.answer("Możesz odświeżyć ogłoszenie raz dziennie.", show_alert=True)
         return
 
-    listing = await SFSManager.get_listing_by_owner(user_id)
     if not listing:
         await callback.answer("Brak wpisu SFS.", show_alert=True)
-        await _show_sfs_main(callback)
+        await _show_sfs_main(callback, has_listing=False)
         return
 
     channel_id = listing["channel_id"]
-    members_count = listing.get("members_count") or 0
-    try:
-        members_count = await bot.get_chat_member_count(chat_id=channel_id)
-    except Exception as e:
-        logger.warning("SFS refresh get_chat_member_count: %s", e)
+    members_count = await _get_member_count(bot, channel_id, default=listing.get("members_count") or 0)
 
     now = datetime.now()
     await SFSManager.update_listing_refresh(
@@ -257,7 +423,7 @@ async def sfs_refresh(callback: CallbackQuery, bot: Bot):
         members_count=members_count,
     )
     await callback.answer("✅ Ogłoszenie odświeżone (podbicie)!", show_alert=True)
-    await _show_sfs_main(callback)
+    await _show_sfs_main(callback, has_listing=True)
 
 
 def _format_listing_card(row: dict) -> str:
@@ -277,135 +443,113 @@ def _format_listing_card(row: dict) -> str:
     )
 
 
-@sfs_router.callback_query(F.data.startswith(SFS_LIST_PAGE_PREFIX))
-async def sfs_list_page(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    """Lista SFS – każde ogłoszenie osobna wiadomość, max 10 na stronę, paginacja, reputacja po owner_id."""
-    try:
-        page_str = callback.data.replace(SFS_LIST_PAGE_PREFIX, "").strip()
-        page = int(page_str)
-    except ValueError:
-        page = 0
+def _rate_row(owner_id: int, up: int, down: int, num: Optional[int] = None) -> list:
+    """Wiersz przycisków reputacji (z numerem ogłoszenia na stronie, jeśli podany)."""
+    prefix = f"{num}. " if num else ""
+    return [
+        InlineKeyboardButton(text=f"{prefix}👍 {up}", callback_data=SfsRate(owner_id=owner_id, up=True).pack()),
+        InlineKeyboardButton(text=f"{prefix}👎 {down}", callback_data=SfsRate(owner_id=owner_id, up=False).pack()),
+    ]
+
 
-    total = await SFSManager.get_listings_total()
+@sfs_router.callback_query(SfsPage.filter())
+async def sfs_list_page(callback: CallbackQuery, callback_data: SfsPage, state: FSMContext, bot: Bot):
+    """Lista SFS – jedna wiadomość na stronę (max 10 ogłoszeń), pod nią łapki per ogłoszenie i paginacja."""
+    page = max(callback_data.page, 0)
+
+    total = await _cached_total()
     if total == 0:
         await callback.message.edit_text(
             "📋 <b>Lista SFS</b>\n\nBrak ogłoszeń. Bądź pierwszy – zgłoś się do SFS!",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔙 Powrót do menu SFS", callback_data="sfs_start")],
-            ]),
+            reply_markup=_EMPTY_LIST_KB,
             parse_mode=ParseMode.HTML,
         )
         await callback.answer()
         return
 
-    listings = await SFSManager.get_listings_page(page, PER_PAGE)
+    # total z cache w pamięci (_cached_total) – paginacja nie robi COUNT(*) przy każdej stronie.
+    # Strona spoza zakresu (np. po usunięciu wpisów) → ostatnia istniejąca, bez pustego zapytania.
     total_pages = (total + PER_PAGE - 1) // PER_PAGE if total else 1
+    page = min(page, total_pages - 1)
+    listings = await SFSManager.get_listings_page(page, PER_PAGE)
     chat_id = callback.message.chat.id
 
-    # Usuń poprzednie wiadomości listy (jeśli były)
+    # Usuń wiadomości listy z poprzedniego układu (osobna wiadomość na kartę), jeśli zostały w stanie
     data = await state.get_data()
     prev_ids = data.get("sfs_list_message_ids") or []
-    for mid in prev_ids:
-        try:
-            await bot.delete_message(chat_id=chat_id, message_id=mid)
-        except Exception:
-            pass
+    current_id = callback.message.message_id
+    await _delete_list_messages(bot, chat_id, [mid for mid in prev_ids if mid != current_id])
 
-    sent_ids = []
-    # Każde ogłoszenie – osobna wiadomość (karta) z przyciskami reputacji
-    for row in listings:
-        owner_id = row["owner_id"]
-        card_text = _format_listing_card(row)
-        thumbs_up = row.get("thumbs_up") or 0
-        thumbs_down = row.get("thumbs_down") or 0
-        kb = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(text=f"👍 {thumbs_up}", callback_data=f"sfs_rate_{owner_id}_up"),
-                InlineKeyboardButton(text=f"👎 {thumbs_down}", callback_data=f"sfs_rate_{owner_id}_down"),
-            ],
-        ])
-        msg = await bot.send_message(
-            chat_id=chat_id,
-            text=card_text,
-            reply_markup=kb,
-            parse_mode=ParseMode.HTML,
+    text = (
+        f"📋 <b>Lista SFS</b> — strona <b>{page + 1}</b> z <b>{total_pages}</b>\n\n"
+        + "\n\n".join(
+            f"<b>{n}.</b> {_format_listing_card(row)}"
+            for n, row in enumerate(listings, start=1)
         )
-        sent_ids.append(msg.message_id)
-
-    # Wiadomość z paginacją i powrotem
+    )
+    keyboard = [
+        _rate_row(row["owner_id"], row.get("thumbs_up") or 0, row.get("thumbs_down") or 0, n)
+        for n, row in enumerate(listings, start=1)
+    ]
     nav = []
     if page > 0:
-        nav.append(InlineKeyboardButton(text="◀ Poprzednia", callback_data=f"{SFS_LIST_PAGE_PREFIX}{page - 1}"))
+        nav.append(InlineKeyboardButton(text="◀ Poprzednia", callback_data=SfsPage(page=page - 1).pack()))
     if page < total_pages - 1:
-        nav.append(InlineKeyboardButton(text="Następna ▶", callback_data=f"{SFS_LIST_PAGE_PREFIX}{page + 1}"))
-    pagination_text = (
-        f"📋 <b>Lista SFS</b>\n"
-        f"Strona <b>{page + 1}</b> z <b>{total_pages}</b>"
-    )
+        nav.append(InlineKeyboardButton(text="Następna ▶", callback_data=SfsPage(page=page + 1).pack()))
     if nav:
-        pagination_kb = InlineKeyboardMarkup(inline_keyboard=[nav])
-    else:
-        pagination_kb = InlineKeyboardMarkup(inline_keyboard=[])
-    pagination_kb.inline_keyboard.append([InlineKeyboardButton(text="🔙 Powrót do menu SFS", callback_data="sfs_start")])
-    pag_msg = await bot.send_message(
-        chat_id=chat_id,
-        text=pagination_text,
-        reply_markup=pagination_kb,
+        keyboard.append(nav)
+    keyboard.append([_BACK_TO_SFS_BTN])
+
+    # Edycja wiadomości z przyciskiem zamiast wysyłania nowych – jedno wywołanie API na stronę
+    await callback.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
         parse_mode=ParseMode.HTML,
     )
-    sent_ids.append(pag_msg.message_id)
-
-    await state.update_data(sfs_list_message_ids=sent_ids, sfs_list_page=page)
-    # Usuń oryginalną wiadomość z przycisku "Lista SFS" (żeby nie duplikować)
-    try:
-        await callback.message.delete()
-    except Exception:
-        pass
+    await state.update_data(sfs_list_message_ids=[], sfs_list_page=page)
     await callback.answer()
 
 
-@sfs_router.callback_query(F.data.startswith("sfs_rate_"))
-async def sfs_rate(callback: CallbackQuery):
+@sfs_router.callback_query(SfsRate.filter())
+async def sfs_rate(callback: CallbackQuery, callback_data: SfsRate):
     """Ocena (łapka) – po owner_id. Tylko użytkownik z min. 100 subów na kanale free."""
     user_id = callback.from_user.id
-    parts = callback.data.split("_")
-    if len(parts) < 4:
-        await callback.answer()
-        return
-    try:
-        owner_id = int(parts[2])
-    except ValueError:
-        await callback.answer()
-        return
-    direction = parts[3]
-    vote = 1 if direction == "up" else -1
+    owner_id = callback_data.owner_id
+    vote = 1 if callback_data.up else -1
 
-    if not await SFSManager.can_user_rate(user_id):
+    # Uprawnienie i liczniki (już z tym głosem) równolegle – przy braku uprawnień liczniki są pomijane
+    allowed, (up, down) = await asyncio.gather(
+        SFSManager.can_user_rate(user_id),
+        _rating_counts_with_pending(owner_id, extra={user_id: vote}),
+    )
+    if not allowed:
         await callback.answer(
             f"Potrzebujesz min. {MIN_SUBS_TO_RATE} subów na swoim kanale free, żeby oceniać.",
             show_alert=True,
         )
         return
 
-    await SFSManager.set_rating(owner_id, user_id, vote)
-
-    # Odśwież tylko tę wiadomość (reputacja tego użytkownika)
-    up, down = await SFSManager.get_rating_counts(owner_id)
-    listing = await SFSManager.get_listing_by_owner(owner_id)
-    if listing:
-        card_text = _format_listing_card(listing)
-    else:
-        card_text = "—  ·  Ogłoszenie usunięte  ·  reputacja: 👍 {} 👎 {}".format(up, down)
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text=f"👍 {up}", callback_data=f"sfs_rate_{owner_id}_up"),
-            InlineKeyboardButton(text=f"👎 {down}", callback_data=f"sfs_rate_{owner_id}_down"),
-        ],
-    ])
-    try:
-        await callback.message.edit_text(card_text, reply_markup=kb, parse_mode=ParseMode.HTML)
-    except Exception:
-        pass
+    # Zapis w paczce (flush_pending_ratings)
+    _pending_votes[(owner_id, user_id)] = vote
+
+    # Podmień tylko wiersz łapek tego ogłoszenia (tekst listy bez zmian)
+    up_data = SfsRate(owner_id=owner_id, up=True).pack()
+    markup = callback.message.reply_markup
+    rows = list(markup.inline_keyboard) if markup else []
+    changed = False
+    for idx, row in enumerate(rows):
+        if row and row[0].callback_data == up_data:
+            num = row[0].text.split(". ", 1)[0]
+            new_row = _rate_row(owner_id, up, down, int(num) if num.isdigit() else None)
+            changed = [b.text for b in new_row] != [b.text for b in row]
+            rows[idx] = new_row
+            break
+    # Ten sam głos ponownie (liczniki bez zmian) – bez wywołania API ("message is not modified")
+    if changed:
+        try:
+            await callback.message.edit_reply_markup(reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+        except Exception:
+            pass
     await callback.answer("✅ Ocena zapisana.")
 
 
@@ -416,17 +560,26 @@ async def run_update_sfs_members_count(bot: Bot) -> None:
         if not listings:
             return
         logger.info("SFS: aktualizacja subów dla %d wpisów", len(listings))
-        for item in listings:
-            owner_id = item.get("owner_id")
-            channel_id = item.get("channel_id")
-            if owner_id is None or channel_id is None:
-                continue
-            try:
-                members_count = await bot.get_chat_member_count(chat_id=channel_id)
-                if members_count >= 0:
-                    await SFSManager.update_listing_members_count(owner_id, members_count)
-            except Exception as e:
-                logger.debug("SFS get_chat_member_count channel_id=%s: %s", channel_id, e)
-            await asyncio.sleep(2)
+        sem = asyncio.Semaphore(10)
+        pairs: list[tuple[int, int]] = []
+
+        async def one(owner_id: int, channel_id: int) -> None:
+            async with sem:
+                try:
+                    # Zawsze świeża wartość z Telegrama – przy okazji odświeża cache dla handlerów
+                    members_count = await bot.get_chat_member_count(chat_id=channel_id)
+                    _member_count_cache[channel_id] = (time.monotonic(), members_count)
+                    if members_count >= 0:
+                        pairs.append((owner_id, members_count))
+                except Exception as e:
+                    logger.debug("SFS get_chat_member_count channel_id=%s: %s", channel_id, e)
+
+        await asyncio.gather(*(
+            one(item["owner_id"], item["channel_id"])
+            for item in listings
+            if item.get("owner_id") is not None and item.get("channel_id") is not None
+        ))
+        # Jeden UPDATE dla wszystkich wpisów zamiast osobnego na każdy
+        await SFSManager.bulk_update_members_count(pairs)
     except Exception as e:
         logger.warning("SFS run_update_sfs_members_count: %s", e)
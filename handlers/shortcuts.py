@@ -70,7 +70,7 @@ async def _handle_channel_shortcut(message: Message, state: FSMContext, channel_
         else:
             # Domyślna akcja: Potwierdzenie wyboru i menu
             # Pobranie tytułu kanału dla ładniejszego komunikatu
-            channels = await ChannelManager.get_user_channels(user_id)
+            channels = await ChannelManager.get_user_channels_cached(user_id)
             channel_info = next((ch for ch in channels if ch['channel_id'] == target_channel_id), None)
             title = channel_info['title'] if channel_info else "Nieznany"
             
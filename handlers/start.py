@@ -1,4 +1,7 @@
 # handlers/start.py
+from collections import OrderedDict
+from html import escape as _html_escape
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
@@ -11,11 +14,31 @@ from aiogram.enums import ParseMode
 
 start_router = Router(name="start")
 
+# Gotowe menu główne: user_id -> (lista kanałów, z której zbudowano, tekst, klawiatura).
+# Ważne, dopóki get_user_channels_cached zwraca tę samą listę (TTL + invalidate_user_channels przy dodaniu/usunięciu kanału).
+_MENU_CACHE_MAX = 10_000
+_menu_cache: "OrderedDict[int, tuple]" = OrderedDict()
+
+# Stałe elementy klawiatur menu – budowane raz (modele pydantic), aiogram serializuje je przy każdym wysłaniu
+_WELCOME_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="➕ Dodaj kanał", callback_data="add_new_channel_help")]
+])
+_TAIL_ROWS = (
+    [
+        InlineKeyboardButton(text="📅 Planer postów", callback_data="post_planning_start"),
+        InlineKeyboardButton(text="📢 SFS System", callback_data="sfs_start"),
+    ],
+    [InlineKeyboardButton(text="📊 Statystyki", callback_data="general_stats")],
+    [InlineKeyboardButton(text="➕ Dodaj kanał", callback_data="add_new_channel_help")],
+)
+_SUPERADMIN_ROW = [InlineKeyboardButton(text="🔐 Super-Admin", callback_data="superadmin_panel")]
+
 # HTML daje pewne formatowanie; w treści od użytkownika escapuj < > &
 def _h(s: str) -> str:
     if not s:
         return ""
-    return str(s).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    # html.escape (quote=False) – te same zamiany & < >, jeden przebieg zamiast trzech replace
+    return _html_escape(str(s), quote=False)
 
 @start_router.message(Command("start"))
 async def cmd_start(message: Message, state: FSMContext):
@@ -27,8 +50,8 @@ async def show_main_menu(message: Message, user_id: int, state: FSMContext):
     """Logika wyświetlania głównego menu"""
     await state.clear()
 
-    # Pobierz kanały użytkownika
-    channels = await ChannelManager.get_user_channels(user_id)
+    # Pobierz kanały użytkownika (cache w pamięci, unieważniany przy zmianie kanałów)
+    channels = await ChannelManager.get_user_channels_cached(user_id)
 
     if not channels:
         welcome_text = (
@@ -41,34 +64,55 @@ async def show_main_menu(message: Message, user_id: int, state: FSMContext):
             "• <b>Planer postów</b> — publikuj treści o wybranej godzinie na dowolnym kanale\n\n"
             "⚡|<b>Powered by @thunder_threads</b>\n"
         )
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="➕ Dodaj kanał", callback_data="add_new_channel_help")]
-        ])
-        await message.answer(welcome_text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+        await message.answer(welcome_text, parse_mode=ParseMode.HTML, reply_markup=_WELCOME_KB)
         return
 
+    hit = _menu_cache.get(user_id)
+    if hit is not None and hit[0] is channels:
+        _menu_cache.move_to_end(user_id)
+        msg_text, markup = hit[1], hit[2]
+    else:
+        msg_text, markup = _build_main_menu(channels, user_id)
+        _menu_cache[user_id] = (channels, msg_text, markup)
+        if len(_menu_cache) > _MENU_CACHE_MAX:
+            _menu_cache.popitem(last=False)
+
+    await message.answer(msg_text, reply_markup=markup, parse_mode=ParseMode.HTML)
+
+def _build_main_menu(channels: list, user_id: int) -> tuple[str, InlineKeyboardMarkup]:
+    """Tekst i klawiatura menu głównego dla niepustej listy kanałów."""
     # Budowanie klawiatury z kanałami
-    # Sortowanie kanałów
-    premium_channels = [ch for ch in channels if ch['type'] == 'premium']
-    free_channels = [ch for ch in channels if ch['type'] == 'free']
+    # Sortowanie kanałów – jeden przebieg (inne typy niż premium/free pomijane jak dotąd)
+    premium_channels, free_channels = [], []
+    for ch in channels:
+        t = ch['type']
+        if t == 'premium':
+            premium_channels.append(ch)
+        elif t == 'free':
+            free_channels.append(ch)
 
     # Tekst główny — HTML dla pewnego formatowania
-    msg_text = (
+    parts = [
         "✨ <b>Witaj w centrum dowodzenia</b>\n\n"
         "Subskrypcje, planer postów i statystyki w jednym miejscu\n\n"
         "<i>(Przez ograniczenia telegrama bot <b>nie</b> widzi użytkowników, którzy byli na kanale przed dołączeniem bota)</i>\n\n"
-    )
+    ]
     if premium_channels or free_channels:
         if premium_channels:
-            msg_text += "💎 <b>Premium</b> \n"
-            msg_text += "1. <i>Gdy ktoś nowy dołączy do kanału, bot wyśle Ci powiadomienie i zapyta o rodzaj i czas subskrybcji</i> \n"
-            msg_text += "2. <i>Gdy subskrybcja wygasa, bot automatycznie usuwa użytkownika z premium i Cię o tym powiadamia</i> \n\n"
+            parts.append(
+                "💎 <b>Premium</b> \n"
+                "1. <i>Gdy ktoś nowy dołączy do kanału, bot wyśle Ci powiadomienie i zapyta o rodzaj i czas subskrybcji</i> \n"
+                "2. <i>Gdy subskrybcja wygasa, bot automatycznie usuwa użytkownika z premium i Cię o tym powiadamia</i> \n\n"
+            )
         if free_channels:
-            msg_text += "🆓 <b>Free</b> \n"
-            msg_text += "- <i>Gdy ktoś nowy dołączy do kanału, bot Cię o tym informuje, a Ty możesz szybko rozpocząć konwersację :)</i> \n"
-        msg_text += "\n👇 Kliknij przycisk poniżej:"
+            parts.append(
+                "🆓 <b>Free</b> \n"
+                "- <i>Gdy ktoś nowy dołączy do kanału, bot Cię o tym informuje, a Ty możesz szybko rozpocząć konwersację :)</i> \n"
+            )
+        parts.append("\n👇 Kliknij przycisk poniżej:")
     else:
-        msg_text += "👇 Wybierz akcję:"
+        parts.append("👇 Wybierz akcję:")
+    msg_text = "".join(parts)
 
     # Klawiatura: premium i free w dwóch kolumnach obok siebie
     keyboard = []
@@ -90,20 +134,11 @@ async def show_main_menu(message: Message, user_id: int, state: FSMContext):
         if row:
             keyboard.append(row)
 
-    keyboard.append([
-        InlineKeyboardButton(text="📅 Planer postów", callback_data="post_planning_start"),
-        InlineKeyboardButton(text="📢 SFS System", callback_data="sfs_start"),
-    ])
-    keyboard.append([InlineKeyboardButton(text="📊 Statystyki", callback_data="general_stats")])
-    keyboard.append([InlineKeyboardButton(text="➕ Dodaj kanał", callback_data="add_new_channel_help")])
+    keyboard.extend(_TAIL_ROWS)
     if settings.is_superadmin(user_id):
-        keyboard.append([InlineKeyboardButton(text="🔐 Super-Admin", callback_data="superadmin_panel")])
+        keyboard.append(_SUPERADMIN_ROW)
 
-    await message.answer(
-        msg_text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-        parse_mode=ParseMode.HTML
-    )
+    return msg_text, InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 @start_router.callback_query(F.data == "refresh_channels")
 async def refresh_channels(callback: CallbackQuery, state: FSMContext):
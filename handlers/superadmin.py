@@ -1,12 +1,21 @@
 """
 Panel super-admina (tylko ADMIN_ID): Dashboard, Kanały/Użytkownicy, Broadcast, Ochrona, Narzędzia, Eksport.
 """
+import asyncio
+import hashlib
 import io
 import json
 import logging
+import re
+from operator import itemgetter
+import time
 from datetime import datetime
 
 from aiogram import Router, F, Bot
+try:
+    import orjson  # opcjonalnie – szybsza serializacja eksportów
+except ImportError:
+    orjson = None
 from aiogram.types import (
     Message,
     CallbackQuery,
@@ -14,11 +23,13 @@ from aiogram.types import (
     InlineKeyboardButton,
     ContentType,
     BufferedInputFile,
+    MessageEntity,
 )
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.enums import ParseMode
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.utils.formatting import Text, Bold
 
 from config import settings
 from database.models import (
@@ -32,10 +43,17 @@ from database.models import (
 )
 from utils.states import SuperAdminBroadcast, SuperAdminBlacklist, SuperAdminInbox, SuperAdminChatUser
 from utils.scheduler import BotScheduler
-from handlers.events import get_pending_join_requests, pop_pending_join_request
+from utils.log_buffer import recent_lines_newest_first
+from handlers.events import get_pending_join_requests, get_pending_join_requests_bulk, pop_pending_join_request
+from handlers.sfs import run_update_sfs_members_count
+from middlewares.auth import SuperAdminOnlyMiddleware
 
 logger = logging.getLogger("handlers")
 superadmin_router = Router(name="superadmin")
+# Jedna bramka dostępu dla wszystkich callbacków i wiadomości routera (zamiast sprawdzania uprawnień w każdym handlerze)
+_admin_gate = SuperAdminOnlyMiddleware()
+superadmin_router.callback_query.middleware(_admin_gate)
+superadmin_router.message.middleware(_admin_gate)
 
 ADMIN_ID = settings.ADMIN_ID
 PER_PAGE_CHANNELS = 8
@@ -43,31 +61,230 @@ PER_PAGE_USERS = 15
 PER_PAGE_BLACKLIST = 15
 PER_PAGE_CHAT_USERS = 12
 
+# Parsowanie callback_data stronicowanych list (jeden match zamiast split + int w try/except)
+_CB_CH_PAGE = re.compile(r"superadmin_channels_page_(all|premium|free)_(\d+)")
+_CB_USERS_ALL = re.compile(r"superadmin_users_all_(\d+)")
+_CB_USERS_CH = re.compile(r"superadmin_users_ch_(-?\d+)_(\d+)")
+_CB_CHAT_USERS_PAGE = re.compile(r"superadmin_chat_users_page_(\d+)")
+_CB_BLACKLIST_PAGE = re.compile(r"superadmin_blacklist_page_(\d+)")
 
-def _is_admin(user_id: int) -> bool:
-    return settings.is_superadmin(user_id)
+
+# Cache łącznych liczników dla stronicowanych list (COUNT(*) przy każdym kliknięciu ◀/▶ jest zbędny)
+_COUNT_TTL = 30.0
+_count_cache: dict[tuple, tuple[float, int]] = {}
+
+
+async def _cached_count(key: tuple, factory, ttl: float = _COUNT_TTL) -> int:
+    """Zwraca licznik z cache (key -> (expiry, value)); po wygaśnięciu woła factory()."""
+    now = time.monotonic()
+    hit = _count_cache.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+    value = await factory()
+    _count_cache[key] = (now + ttl, value)
+    return value
+
+
+def _invalidate_counts(*kinds: str) -> None:
+    """Usuwa liczniki danego rodzaju (pierwszy element klucza); bez argumentów – wszystkie."""
+    if not kinds:
+        _count_cache.clear()
+        return
+    for key in [k for k in _count_cache if k[0] in kinds]:
+        del _count_cache[key]
+
+
+# Statyczne klawiatury – budowane raz przy imporcie
+_MAIN_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📊 Dashboard", callback_data="superadmin_dashboard")],
+    [InlineKeyboardButton(text="📋 Kanały i użytkownicy", callback_data="superadmin_channels_menu")],
+    [InlineKeyboardButton(text="💬 Aktywni użytkownicy (chat)", callback_data="superadmin_chat_users")],
+    [InlineKeyboardButton(text="📢 Broadcast", callback_data="superadmin_broadcast")],
+    [InlineKeyboardButton(text="📩 Inbox / Wiadomości", callback_data="superadmin_inbox_info")],
+    [InlineKeyboardButton(text="🛡️ Ochrona", callback_data="superadmin_protection")],
+    [InlineKeyboardButton(text="🔧 Narzędzia", callback_data="superadmin_tools")],
+    [InlineKeyboardButton(text="📜 Konsolka (logi)", callback_data="superadmin_console")],
+    [InlineKeyboardButton(text="⚠️ Strefa niebezpieczna", callback_data="superadmin_danger")],
+])
+
+_CHANNELS_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📺 Lista kanałów", callback_data="superadmin_channels_list")],
+    [InlineKeyboardButton(text="👥 Lista użytkowników", callback_data="superadmin_users_choice")],
+    [InlineKeyboardButton(text="🔙 Menu", callback_data="superadmin_panel")],
+])
+
+_BACK_TO_PANEL_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🔙 Menu", callback_data="superadmin_panel")],
+])
+
+_BROADCAST_CANCEL_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="❌ Anuluj", callback_data="superadmin_panel")],
+])
+
+_BROADCAST_CONFIRM_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="✅ Wyślij", callback_data="superadmin_bc_confirm_yes")],
+    [InlineKeyboardButton(text="❌ Anuluj", callback_data="superadmin_bc_confirm_no")],
+])
+
+_TOOLS_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🔍 Sprawdź wygasłe subskrypcje", callback_data="superadmin_tool_check_expired")],
+    [InlineKeyboardButton(text="🔄 SFS autofill", callback_data="superadmin_tool_sfs_autofill")],
+    [InlineKeyboardButton(text="🚫 Join requesty (free) — sprawdź / usuń", callback_data="superadmin_join_requests_menu")],
+    [InlineKeyboardButton(text="🔙 Menu", callback_data="superadmin_panel")],
+])
+
+_JOIN_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📋 Sprawdź wszystkie (na moich free)", callback_data="superadmin_join_list")],
+    [InlineKeyboardButton(text="🚫 Usuń wszystkie (na wybranym free)", callback_data="superadmin_join_decline_all")],
+    [InlineKeyboardButton(text="🔙 Narzędzia", callback_data="superadmin_tools")],
+])
+
+_JOIN_BACK_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🔙 Join requesty", callback_data="superadmin_join_requests_menu")],
+    [InlineKeyboardButton(text="🔙 Narzędzia", callback_data="superadmin_tools")],
+])
+
+_JOIN_MENU_BACK_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🔙 Join requesty", callback_data="superadmin_join_requests_menu")],
+])
+
+_DANGER_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📥 Eksport: Kanały", callback_data="superadmin_export_channels")],
+    [InlineKeyboardButton(text="📥 Eksport: Subskrypcje", callback_data="superadmin_export_subs")],
+    [InlineKeyboardButton(text="🔙 Menu", callback_data="superadmin_panel")],
+])
+
+# Stałe teksty menu jako gotowe text + entities (parse_mode=None) – Telegram nie parsuje Markdownu przy każdym kliknięciu
+_TOOLS_MSG = Text("🔧 ", Bold("Narzędzia"), "\n\nWybierz akcję:").as_kwargs()
+_DANGER_MSG = Text("⚠️ ", Bold("Strefa niebezpieczna"), "\n\nEksport danych (CSV/JSON):").as_kwargs()
+_INBOX_INFO_MSG = Text(
+    "📩 ", Bold("Inbox"), "\n\n",
+    "Gdy użytkownik pisze do bota wiadomość (prywatnie, nie komendę), dostaniesz ją tutaj z przyciskami ",
+    Bold("Odpowiedz"), " i ", Bold("Wycisz"), ".\n\n",
+    "• ", Bold("Odpowiedz"), " — napiszesz wiadomość, która zostanie wysłana do tego użytkownika.\n",
+    "• ", Bold("Wycisz"), " — przestaniesz dostawać powiadomienia od tego użytkownika.",
+).as_kwargs()
+
+_BACK_TO_PANEL_ROW = [InlineKeyboardButton(text="🔙 Menu", callback_data="superadmin_panel")]
+_BACK_TO_PROTECTION_ROW = [InlineKeyboardButton(text="🔙 Wróć", callback_data="superadmin_protection")]
+_BLACKLIST_ADD_ROWS = [
+    [InlineKeyboardButton(text="➕ Dodaj user_id", callback_data="superadmin_blacklist_add")],
+    [InlineKeyboardButton(text="➕ Ban + opuść kanały", callback_data="superadmin_blacklist_add_full")],
+]
+
+_CHANNELS_FILTER_ROW = [
+    InlineKeyboardButton(text="Wszystkie", callback_data="superadmin_channels_filter_all"),
+    InlineKeyboardButton(text="Premium", callback_data="superadmin_channels_filter_premium"),
+    InlineKeyboardButton(text="Free", callback_data="superadmin_channels_filter_free"),
+]
 
 
 def _main_menu_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📊 Dashboard", callback_data="superadmin_dashboard")],
-        [InlineKeyboardButton(text="📋 Kanały i użytkownicy", callback_data="superadmin_channels_menu")],
-        [InlineKeyboardButton(text="💬 Aktywni użytkownicy (chat)", callback_data="superadmin_chat_users")],
-        [InlineKeyboardButton(text="📢 Broadcast", callback_data="superadmin_broadcast")],
-        [InlineKeyboardButton(text="📩 Inbox / Wiadomości", callback_data="superadmin_inbox_info")],
-        [InlineKeyboardButton(text="🛡️ Ochrona", callback_data="superadmin_protection")],
-        [InlineKeyboardButton(text="🔧 Narzędzia", callback_data="superadmin_tools")],
-        [InlineKeyboardButton(text="📜 Konsolka (logi)", callback_data="superadmin_console")],
-        [InlineKeyboardButton(text="⚠️ Strefa niebezpieczna", callback_data="superadmin_danger")],
-    ])
+    return _MAIN_MENU_KB
+
+
+# Wyprzedzające pobieranie stron: admin_id -> {widok: (czas startu, task)}; wyniki starsze niż 10 s są pomijane
+_PREFETCH_TTL = 10.0
+_prefetch: dict[int, dict[tuple, tuple[float, asyncio.Task]]] = {}
+
+
+def _start_prefetch(admin_id: int, view: tuple, coro) -> None:
+    now = time.monotonic()
+    slots = _prefetch.setdefault(admin_id, {})
+    for key in [k for k, (started, _) in slots.items() if now - started > _PREFETCH_TTL]:
+        slots.pop(key)[1].cancel()
+    old = slots.pop(view, None)
+    if old is not None:
+        old[1].cancel()
+    slots[view] = (now, asyncio.create_task(coro))
+
+
+def _take_prefetch(admin_id: int, view: tuple) -> asyncio.Task | None:
+    entry = _prefetch.get(admin_id, {}).pop(view, None)
+    if entry is None:
+        return None
+    started, task = entry
+    if time.monotonic() - started > _PREFETCH_TTL or task.cancelled():
+        task.cancel()
+        return None
+    return task
+
+
+# Zadania w tle: „napisz jako bot”, opuszczanie kanałów po banie (silne referencje do czasu zakończenia)
+_bg_tasks: set[asyncio.Task] = set()
+
+
+def _spawn(coro) -> None:
+    task = asyncio.create_task(coro)
+    _bg_tasks.add(task)
+    task.add_done_callback(_bg_tasks.discard)
+
+# Limit edycji paneli per czat (token bucket): 5 na zapas, +1 co sekundę – nadmiarowe kliknięcia dostają toast
+_EDIT_BUCKET_SIZE = 5.0
+_EDIT_BUCKET_RATE = 1.0
+# Czat -> (tokeny, czas); wpis przenoszony na koniec przy każdym użyciu, ponad _EDIT_BUCKET_MAX wypada
+# najdawniej używany (zwykle czat dawno nieaktywny, którego wiadro i tak zdążyło się napełnić)
+_edit_bucket: dict[int, tuple[float, float]] = {}
+_EDIT_BUCKET_MAX = 500
+
+
+async def _throttled(callback: CallbackQuery) -> bool:
+    """True (i odpowiedź „Za szybko”), gdy czat wyczerpał limit edycji; inaczej zużywa token i zwraca False."""
+    chat_id = callback.message.chat.id
+    now = time.monotonic()
+    tokens, last = _edit_bucket.pop(chat_id, (_EDIT_BUCKET_SIZE, now))
+    tokens = min(_EDIT_BUCKET_SIZE, tokens + (now - last) * _EDIT_BUCKET_RATE)
+    throttled = tokens < 1.0
+    _edit_bucket[chat_id] = (tokens if throttled else tokens - 1.0, now)
+    if len(_edit_bucket) > _EDIT_BUCKET_MAX:
+        del _edit_bucket[next(iter(_edit_bucket))]
+    if throttled:
+        await callback.answer("Za szybko")
+    return throttled
+
+
+# Ostatnio wyrenderowana strona per wiadomość: (chat_id, message_id) -> (podpis treści, edit_date, widok)
+_last_render: dict[tuple[int, int], tuple[bytes, object, tuple | None]] = {}
+_LAST_RENDER_MAX = 500
+
+
+def _current_view(callback: CallbackQuery) -> tuple | None:
+    """Widok (np. ("channels", filtr, strona)) wyświetlany teraz w wiadomości, jeśli nikt jej od tego czasu nie edytował."""
+    msg = callback.message
+    prev = _last_render.get((msg.chat.id, msg.message_id))
+    if prev is not None and prev[1] == getattr(msg, "edit_date", None):
+        return prev[2]
+    return None
+
+
+async def _edit_render(
+    callback: CallbackQuery, text: str, markup: InlineKeyboardMarkup, parse_mode: str, view: tuple | None = None
+) -> bool:
+    """
+    edit_text tylko gdy treść lub klawiatura się zmieniły (ponowny klik filtra/strony nie zużywa limitu API).
+    edit_date w podpisie: jeśli wiadomość edytował inny handler, render zawsze idzie do Telegrama.
+    TelegramBadRequest propaguje jak przy zwykłym edit_text. Zwraca False, gdy edycję pominięto.
+    """
+    msg = callback.message
+    key = (msg.chat.id, msg.message_id)
+    sig = hashlib.blake2b((text + repr(markup.model_dump())).encode(), digest_size=8).digest()
+    prev = _last_render.get(key)
+    if prev is not None and prev[:2] == (sig, getattr(msg, "edit_date", None)):
+        return False
+    result = await msg.edit_text(text, reply_markup=markup, parse_mode=parse_mode)
+    _last_render.pop(key, None)
+    edit_date = getattr(result, "edit_date", None)
+    if edit_date is None:
+        return True
+    _last_render[key] = (sig, edit_date, view)
+    if len(_last_render) > _LAST_RENDER_MAX:
+        del _last_render[next(iter(_last_render))]
+    return True
 
 
 @superadmin_router.message(Command("superadmin"))
 async def cmd_superadmin(message: Message):
     """Wejście do panelu super-admina – tylko ADMIN_ID."""
-    if not _is_admin(message.from_user.id):
-        await message.reply("🚫 Brak dostępu.")
-        return
     await message.reply(
         "🔐 **Panel Super-Admina**\n\nWybierz sekcję:",
         reply_markup=_main_menu_keyboard(),
@@ -77,9 +294,6 @@ async def cmd_superadmin(message: Message):
 
 @superadmin_router.callback_query(F.data == "superadmin_panel")
 async def callback_superadmin_panel(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     await callback.message.edit_text(
         "🔐 **Panel Super-Admina**\n\nWybierz sekcję:",
         reply_markup=_main_menu_keyboard(),
@@ -91,15 +305,14 @@ async def callback_superadmin_panel(callback: CallbackQuery):
 # ---------- Dashboard ----------
 @superadmin_router.callback_query(F.data == "superadmin_dashboard")
 async def superadmin_dashboard(callback: CallbackQuery, scheduler: BotScheduler):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     try:
-        channels_count = await ChannelManager.count_all_channels()
-        channels_premium = await ChannelManager.count_all_channels("premium")
-        channels_free = await ChannelManager.count_all_channels("free")
-        subs_count = await SubscriptionManager.count_subscriptions()
-        blacklist_count = await GlobalBlacklist.count()
+        channels_count, channels_premium, channels_free, subs_count, blacklist_count = await asyncio.gather(
+            ChannelManager.count_all_channels(),
+            ChannelManager.count_all_channels("premium"),
+            ChannelManager.count_all_channels("free"),
+            SubscriptionManager.count_subscriptions(),
+            GlobalBlacklist.count(),
+        )
         status = scheduler.get_scheduler_status() if scheduler else {}
         status_text = "✅ Aktywny" if status.get("running") else "❌ Nieaktywny"
         job_count = status.get("job_count", 0)
@@ -110,10 +323,7 @@ async def superadmin_dashboard(callback: CallbackQuery, scheduler: BotScheduler)
             f"🚫 Czarna lista: **{blacklist_count}**\n\n"
             f"⏱ Scheduler: {status_text} ({job_count} zadań)"
         )
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔙 Menu", callback_data="superadmin_panel")],
-        ])
-        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
+        await callback.message.edit_text(text, reply_markup=_BACK_TO_PANEL_KB, parse_mode=ParseMode.MARKDOWN)
     except Exception as e:
         logger.exception("superadmin_dashboard: %s", e)
         await callback.answer("Błąd generowania dashboardu", show_alert=True)
@@ -123,17 +333,12 @@ async def superadmin_dashboard(callback: CallbackQuery, scheduler: BotScheduler)
 # ---------- Kanały i użytkownicy (shady dane) ----------
 @superadmin_router.callback_query(F.data == "superadmin_channels_menu")
 async def superadmin_channels_menu(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📺 Lista kanałów", callback_data="superadmin_channels_list")],
-        [InlineKeyboardButton(text="👥 Lista użytkowników", callback_data="superadmin_users_choice")],
-        [InlineKeyboardButton(text="🔙 Menu", callback_data="superadmin_panel")],
-    ])
+    # Najczęstszy następny klik to „Lista kanałów” – pierwsza strona pobierana już teraz
+    _start_prefetch(callback.from_user.id, ("channels", None, 0),
+                    ChannelManager.get_all_channels_with_total(0, PER_PAGE_CHANNELS, None))
     await callback.message.edit_text(
         "📋 **Kanały i użytkownicy**\n\nWybierz:",
-        reply_markup=keyboard,
+        reply_markup=_CHANNELS_MENU_KB,
         parse_mode=ParseMode.MARKDOWN,
     )
     await callback.answer()
@@ -141,17 +346,11 @@ async def superadmin_channels_menu(callback: CallbackQuery):
 
 @superadmin_router.callback_query(F.data == "superadmin_channels_list")
 async def superadmin_channels_list(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     await _render_channels_page(callback, 0, None)
 
 
 @superadmin_router.callback_query(F.data.startswith("superadmin_channels_filter_"))
 async def superadmin_channels_filter(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     part = callback.data.replace("superadmin_channels_filter_", "")
     if part == "all":
         filt = None
@@ -162,49 +361,46 @@ async def superadmin_channels_filter(callback: CallbackQuery):
     else:
         await callback.answer()
         return
+    if _current_view(callback) == ("channels", filt, 0):
+        # Ten filtr jest już wyświetlony – bez zapytań do bazy i bez edit_text
+        await callback.answer("Już wybrano")
+        return
+    if await _throttled(callback):
+        return
     await _render_channels_page(callback, 0, filt)
 
 
 @superadmin_router.callback_query(F.data.startswith("superadmin_channels_page_"))
 async def superadmin_channels_page(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
+    if await _throttled(callback):
         return
-    try:
-        parts = callback.data.split("_")
-        page = int(parts[-1])
-        filt = parts[-2] if len(parts) >= 5 else None
-        if filt == "all":
-            filt = None
-        elif filt not in ("premium", "free"):
-            filt = None
-        await _render_channels_page(callback, page, filt)
-    except (IndexError, ValueError):
+    m = _CB_CH_PAGE.fullmatch(callback.data)
+    if m:
+        filt = None if m.group(1) == "all" else m.group(1)
+        await _render_channels_page(callback, int(m.group(2)), filt)
+    else:
         await _render_channels_page(callback, 0, None)
     await callback.answer()
 
 
+def _format_channel_row(ch: dict) -> str:
+    title = (ch.get("title") or "?")[:30]
+    return f"• **{title}** | {ch.get('type') or '?'} | ID: `{ch.get('channel_id')}` | owner: `{ch.get('owner_id')}`"
+
+
 async def _render_channels_page(callback: CallbackQuery, page: int, type_filter: str | None):
-    total = await ChannelManager.count_all_channels(type_filter)
-    channels = await ChannelManager.get_all_channels(page, PER_PAGE_CHANNELS, type_filter)
-    lines = []
-    for ch in channels:
-        cid = ch.get("channel_id")
-        title = (ch.get("title") or "?")[:30]
-        typ = ch.get("type") or "?"
-        owner = ch.get("owner_id")
-        lines.append(f"• **{title}** | {typ} | ID: `{cid}` | owner: `{owner}`")
+    # Strona i licznik jednym zapytaniem (COUNT(*) OVER()); pierwsza strona zwykle już pobrana w tle
+    prefetched = _take_prefetch(callback.from_user.id, ("channels", type_filter, page))
+    if prefetched is not None:
+        total, channels = await prefetched
+    else:
+        total, channels = await ChannelManager.get_all_channels_with_total(page, PER_PAGE_CHANNELS, type_filter)
     text = (
         "📺 **Lista kanałów**\n\n"
-        + ("\n".join(lines) if lines else "_Brak kanałów_")
+        + ("\n".join(map(_format_channel_row, channels)) or "_Brak kanałów_")
         + f"\n\nStrona {page + 1}/{(max(1, total) + PER_PAGE_CHANNELS - 1) // PER_PAGE_CHANNELS or 1} (łącznie: {total})"
     )
-    kb = []
-    kb.append([
-        InlineKeyboardButton(text="Wszystkie", callback_data="superadmin_channels_filter_all"),
-        InlineKeyboardButton(text="Premium", callback_data="superadmin_channels_filter_premium"),
-        InlineKeyboardButton(text="Free", callback_data="superadmin_channels_filter_free"),
-    ])
+    kb = [_CHANNELS_FILTER_ROW]
     npages = max(1, (total + PER_PAGE_CHANNELS - 1) // PER_PAGE_CHANNELS)
     row = []
     if page > 0:
@@ -217,10 +413,9 @@ async def _render_channels_page(callback: CallbackQuery, page: int, type_filter:
         kb.append(row)
     kb.append([InlineKeyboardButton(text="🔙 Wróć", callback_data="superadmin_channels_menu")])
     try:
-        await callback.message.edit_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=kb),
-            parse_mode=ParseMode.MARKDOWN,
+        await _edit_render(
+            callback, text, InlineKeyboardMarkup(inline_keyboard=kb), ParseMode.MARKDOWN,
+            view=("channels", type_filter, page),
         )
     except TelegramBadRequest:
         pass  # Treść i klawiatura bez zmian (np. ponowne kliknięcie tego samego filtra)
@@ -228,9 +423,6 @@ async def _render_channels_page(callback: CallbackQuery, page: int, type_filter:
 
 @superadmin_router.callback_query(F.data == "superadmin_users_choice")
 async def superadmin_users_choice(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     channels = await ChannelManager.get_all_channels(0, 50, None)
     kb = [[InlineKeyboardButton(text="👥 Wszyscy użytkownicy", callback_data="superadmin_users_all_0")]]
     for ch in channels[:20]:
@@ -248,48 +440,37 @@ async def superadmin_users_choice(callback: CallbackQuery):
 
 @superadmin_router.callback_query(F.data.startswith("superadmin_users_all_"))
 async def superadmin_users_all(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
+    if await _throttled(callback):
         return
-    try:
-        page = int(callback.data.split("_")[-1])
-    except (IndexError, ValueError):
-        page = 0
-    await _render_users_page(callback, page, None)
+    m = _CB_USERS_ALL.fullmatch(callback.data)
+    await _render_users_page(callback, int(m.group(1)) if m else 0, None)
 
 
 @superadmin_router.callback_query(F.data.startswith("superadmin_users_ch_"))
 async def superadmin_users_ch(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
+    if await _throttled(callback):
         return
-    try:
-        parts = callback.data.split("_")
-        channel_id = int(parts[3])
-        page = int(parts[4])
-    except (IndexError, ValueError):
+    m = _CB_USERS_CH.fullmatch(callback.data)
+    if not m:
         await callback.answer("Błąd", show_alert=True)
         return
-    await _render_users_page(callback, page, channel_id)
+    await _render_users_page(callback, int(m.group(2)), int(m.group(1)))
+
+
+def _format_sub_row(s: dict) -> str:
+    uname = (s.get("username") or "—")[:20]
+    fname = (s.get("full_name") or "—")[:20]
+    end = s.get("end_date")
+    end_str = str(end)[:10] if end else "—"
+    return f"• `{s.get('user_id')}` @{uname} | {fname} | {s.get('tier') or '?'} | {s.get('status') or '?'} | do {end_str}"
 
 
 async def _render_users_page(callback: CallbackQuery, page: int, channel_id: int | None):
-    total = await SubscriptionManager.count_subscriptions(channel_id)
-    subs = await SubscriptionManager.get_all_subscriptions_paginated(channel_id, page, PER_PAGE_USERS)
-    lines = []
-    for s in subs:
-        uid = s.get("user_id")
-        uname = (s.get("username") or "—")[:20]
-        fname = (s.get("full_name") or "—")[:20]
-        tier = s.get("tier") or "?"
-        status = s.get("status") or "?"
-        end = s.get("end_date")
-        end_str = str(end)[:10] if end else "—"
-        lines.append(f"• `{uid}` @{uname} | {fname} | {tier} | {status} | do {end_str}")
+    total, subs = await SubscriptionManager.get_subscriptions_page_with_total(channel_id, page, PER_PAGE_USERS)
     title = "Wszyscy" if channel_id is None else f"Kanał {channel_id}"
     text = (
         f"👥 **Użytkownicy ({title})**\n\n"
-        + ("\n".join(lines) if lines else "_Brak_")
+        + ("\n".join(map(_format_sub_row, subs)) or "_Brak_")
         + f"\n\nStrona {page + 1}/{(max(1, total) + PER_PAGE_USERS - 1) // PER_PAGE_USERS or 1} (łącznie: {total})"
     )
     npages = max(1, (total + PER_PAGE_USERS - 1) // PER_PAGE_USERS)
@@ -306,11 +487,7 @@ async def _render_users_page(callback: CallbackQuery, page: int, channel_id: int
             kb.append([InlineKeyboardButton(text="▶", callback_data=f"superadmin_users_all_{page + 1}")])
     kb.append([InlineKeyboardButton(text="🔙 Wróć", callback_data="superadmin_users_choice")])
     try:
-        await callback.message.edit_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=kb),
-            parse_mode=ParseMode.MARKDOWN,
-        )
+        await _edit_render(callback, text, InlineKeyboardMarkup(inline_keyboard=kb), ParseMode.MARKDOWN)
     except TelegramBadRequest:
         pass
 
@@ -319,23 +496,16 @@ async def _render_users_page(callback: CallbackQuery, page: int, channel_id: int
 @superadmin_router.callback_query(F.data == "superadmin_chat_users")
 async def superadmin_chat_users(callback: CallbackQuery):
     """Lista użytkowników z interakcjami z botem (otwarty chat)."""
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     await _render_chat_users_page(callback, 0)
     await callback.answer()
 
 
 @superadmin_router.callback_query(F.data.startswith("superadmin_chat_users_page_"))
 async def superadmin_chat_users_page(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
+    if await _throttled(callback):
         return
-    try:
-        page = int(callback.data.split("_")[-1])
-    except (IndexError, ValueError):
-        page = 0
-    await _render_chat_users_page(callback, page)
+    m = _CB_CHAT_USERS_PAGE.fullmatch(callback.data)
+    await _render_chat_users_page(callback, int(m.group(1)) if m else 0)
     await callback.answer()
 
 
@@ -353,58 +523,51 @@ def _chat_user_label(u: dict) -> str:
     return (label[:60] + "…") if len(label) > 60 else label
 
 
+_HTML_TRANS = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+
 def _html_esc(s: str) -> str:
-    """Escape dla HTML (żeby @ i znaki specjalne nie psuły wiadomości)."""
-    if not s:
-        return ""
-    return str(s).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    """Escape dla HTML (żeby @ i znaki specjalne nie psuły wiadomości) – jeden przebieg translate."""
+    return str(s).translate(_HTML_TRANS) if s else ""
+
+
+def _format_chat_user_row(u: dict, label: str) -> str:
+    last = u.get("last_activity")
+    last_str = last.strftime("%Y-%m-%d %H:%M") if hasattr(last, "strftime") else (str(last)[:16] if last else "—")
+    return f"• <b>{_html_esc(label)}</b> <code>{u.get('user_id')}</code> — ostatnia aktywność: {_html_esc(last_str)}"
 
 
 async def _render_chat_users_page(callback: CallbackQuery, page: int):
-    await BotUsersManager.ensure_user(callback.from_user.id)
-    await BotUsersManager.update_user_display_info(
-        callback.from_user.id,
-        username=callback.from_user.username,
-        full_name=(callback.from_user.first_name or "") + " " + (callback.from_user.last_name or "").strip(),
-    )
-    total = await BotUsersManager.count_users_with_activity()
-    users = await BotUsersManager.get_users_with_activity(page, PER_PAGE_CHAT_USERS)
+    me = callback.from_user
+    full_name = ((me.first_name or "") + " " + (me.last_name or "")).strip()
+    # Jeden upsert zamiast ensure_user + update_display; strona i licznik jednym zapytaniem
+    await BotUsersManager.upsert_display(me.id, username=me.username, full_name=full_name)
+    total, users = await BotUsersManager.page_with_total(page, PER_PAGE_CHAT_USERS)
     logger.info("Aktywni użytkownicy: total=%s, page=%s, len(users)=%s", total, page, len(users))
-
-    lines = []
+    # Jeden przebieg: wiersz tekstu i przycisk per użytkownik (etykieta liczona raz)
+    lines, kb = [], []
     for u in users:
         uid = u.get("user_id")
         label = _chat_user_label(u)
-        last = u.get("last_activity")
-        last_str = last.strftime("%Y-%m-%d %H:%M") if hasattr(last, "strftime") else (str(last)[:16] if last else "—")
-        lines.append(f"• <b>{_html_esc(label)}</b> <code>{uid}</code> — ostatnia aktywność: {_html_esc(last_str)}")
+        lines.append(_format_chat_user_row(u, label))
+        if uid is not None:
+            kb.append([InlineKeyboardButton(text=f"👤 {label}", callback_data=f"superadmin_chat_user_{uid}")])
     npages = max(1, (total + PER_PAGE_CHAT_USERS - 1) // PER_PAGE_CHAT_USERS)
-    body = "\n".join(lines) if lines else "<i>Brak użytkowników w bazie (bot_users).</i>"
+    body = "\n".join(lines) or "<i>Brak użytkowników w bazie (bot_users).</i>"
     text = (
         "💬 <b>Aktywni użytkownicy (chat)</b>\n\n"
         "Użytkownicy, którzy nawiązali kontakt z botem (np. /start).\n\n"
         f"{body}\n\n"
         f"Strona {page + 1}/{npages} (łącznie: {total})"
     )
-    kb = []
-    for u in users:
-        uid = u.get("user_id")
-        if uid is None:
-            continue
-        label = _chat_user_label(u)
-        kb.append([InlineKeyboardButton(text=f"👤 {label}", callback_data=f"superadmin_chat_user_{uid}")])
     if page > 0:
         kb.append([InlineKeyboardButton(text="◀", callback_data=f"superadmin_chat_users_page_{page - 1}")])
     if page < npages - 1:
         kb.append([InlineKeyboardButton(text="▶", callback_data=f"superadmin_chat_users_page_{page + 1}")])
-    kb.append([InlineKeyboardButton(text="🔙 Menu", callback_data="superadmin_panel")])
+    kb.append(_BACK_TO_PANEL_ROW)
 
     try:
-        await callback.message.edit_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=kb),
-            parse_mode=ParseMode.HTML,
-        )
+        await _edit_render(callback, text, InlineKeyboardMarkup(inline_keyboard=kb), ParseMode.HTML)
     except TelegramBadRequest as e:
         logger.warning("Aktywni użytkownicy: edit_text failed: %s", e)
         try:
@@ -420,9 +583,6 @@ async def _render_chat_users_page(callback: CallbackQuery, page: int):
 @superadmin_router.callback_query(F.data.startswith("superadmin_chat_user_"))
 async def superadmin_chat_user_detail(callback: CallbackQuery, bot: Bot, state: FSMContext):
     """Szczegóły użytkownika: ostatnie 20 logów, blok/odblok, napisz jako bot."""
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     part = callback.data.replace("superadmin_chat_user_", "")
     if "_" in part:
         action, uid_str = part.split("_", 1)
@@ -436,11 +596,13 @@ async def superadmin_chat_user_detail(callback: CallbackQuery, bot: Bot, state:
                 await callback.answer("Nie możesz zablokować superadmina.", show_alert=True)
                 return
             await GlobalBlacklist.add(uid)
+            _invalidate_counts("blacklist")
             await callback.answer("Użytkownik zablokowany.", show_alert=True)
             await _render_chat_user_detail(callback, uid)
             return
         if action == "unblock":
             await GlobalBlacklist.remove(uid)
+            _invalidate_counts("blacklist")
             await callback.answer("Użytkownik odblokowany.", show_alert=True)
             await _render_chat_user_detail(callback, uid)
             return
@@ -475,18 +637,22 @@ async def _render_chat_user_detail(callback: CallbackQuery, user_id: int):
     elif full_name:
         user_line = full_name
 
-    logs = await UserInteractionLog.get_last_for_user(user_id, 20)
+    logs = await UserInteractionLog.get_last_for_user(user_id, 20, preview_len=60)
     is_banned = await GlobalBlacklist.is_banned(user_id)
+    # Blok logów budowany od razu z limitem długości (bez sklejania całości i przycinania po fakcie)
     log_lines = []
+    block_len = 0
     for L in logs:
         created = L.get("created_at")
         ts = created.strftime("%m-%d %H:%M") if hasattr(created, "strftime") else str(created)[:16] if created else "?"
         typ = L.get("event_type") or "?"
         prev = (L.get("content_preview") or "")[:60].replace("\n", " ")
-        log_lines.append(f"  {ts} [{typ}] {prev}")
+        line = f"  {ts} [{typ}] {prev}"
+        block_len += len(line) + 1
+        if block_len > 2500:
+            break
+        log_lines.append(line)
     log_block = "\n".join(log_lines) if log_lines else "  (brak logów)"
-    if len(log_block) > 2500:
-        log_block = log_block[-2500:]
     status = "🚫 **Zablokowany**" if is_banned else "✅ Aktywny"
     text = (
         f"👤 **Użytkownik** {user_line}\n"
@@ -502,11 +668,7 @@ async def _render_chat_user_detail(callback: CallbackQuery, user_id: int):
     kb.append([InlineKeyboardButton(text="✉️ Napisz jako bot", callback_data=f"superadmin_chat_user_msg_{user_id}")])
     kb.append([InlineKeyboardButton(text="🔙 Lista", callback_data="superadmin_chat_users")])
     try:
-        await callback.message.edit_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=kb),
-            parse_mode=ParseMode.MARKDOWN,
-        )
+        await _edit_render(callback, text, InlineKeyboardMarkup(inline_keyboard=kb), ParseMode.MARKDOWN)
     except TelegramBadRequest:
         pass
 
@@ -514,8 +676,6 @@ async def _render_chat_user_detail(callback: CallbackQuery, user_id: int):
 @superadmin_router.message(StateFilter(SuperAdminChatUser.waiting_message_to_user), F.text)
 async def superadmin_chat_user_send_message(message: Message, state: FSMContext, bot: Bot):
     """Wysłanie wiadomości jako bot do wybranego użytkownika. /start = anuluj."""
-    if not _is_admin(message.from_user.id):
-        return
     if message.text and message.text.strip() == "/start":
         await state.clear()
         await message.reply("Anulowano. Wiadomość nie została wysłana.")
@@ -526,20 +686,28 @@ async def superadmin_chat_user_send_message(message: Message, state: FSMContext,
     if uid is None:
         await message.reply("Sesja wygasła.")
         return
+    # Wysyłka w tle – handler nie czeka na odpowiedź Telegrama dla docelowego usera
+    status = await message.reply("📤 Wysyłam…")
+    _spawn(_send_and_notify(bot, uid, message.text or "-", status))
+
+
+async def _send_and_notify(bot: Bot, uid: int, text: str, status: Message) -> None:
+    """Wysłanie wiadomości jako bot i podmiana „Wysyłam…” na wynik."""
     try:
-        await bot.send_message(uid, message.text or "-", parse_mode=ParseMode.MARKDOWN)
-        await message.reply(f"✅ Wysłano wiadomość do użytkownika `{uid}`.", parse_mode=ParseMode.MARKDOWN)
+        await bot.send_message(uid, text, parse_mode=ParseMode.MARKDOWN)
+        result = f"✅ Wysłano wiadomość do użytkownika `{uid}`."
     except Exception as e:
         logger.warning("chat_user send_message: %s", e)
-        await message.reply(f"❌ Nie udało się wysłać: {e}")
+        result = f"❌ Nie udało się wysłać: {e}"
+    try:
+        await status.edit_text(result, parse_mode=ParseMode.MARKDOWN if result.startswith("✅") else None)
+    except Exception as e:
+        logger.warning("chat_user send status: %s", e)
 
 
 # ---------- Ochrona ----------
 @superadmin_router.callback_query(F.data == "superadmin_protection")
 async def superadmin_protection(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     maintenance = await SettingsManager.get_maintenance_mode()
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🚫 Czarna lista", callback_data="superadmin_blacklist_list")],
@@ -560,9 +728,6 @@ async def superadmin_protection(callback: CallbackQuery):
 
 @superadmin_router.callback_query(F.data == "superadmin_maintenance_toggle")
 async def superadmin_maintenance_toggle(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     current = await SettingsManager.get_maintenance_mode()
     await SettingsManager.set_maintenance_mode(not current)
     await callback.answer(f"Konserwacja: {'włączona' if not current else 'wyłączona'}", show_alert=True)
@@ -571,32 +736,28 @@ async def superadmin_maintenance_toggle(callback: CallbackQuery):
 
 @superadmin_router.callback_query(F.data == "superadmin_blacklist_list")
 async def superadmin_blacklist_list(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     await _render_blacklist_page(callback, 0)
 
 
 @superadmin_router.callback_query(F.data.startswith("superadmin_blacklist_page_"))
 async def superadmin_blacklist_page(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
+    if await _throttled(callback):
         return
-    try:
-        page = int(callback.data.split("_")[-1])
-    except (IndexError, ValueError):
-        page = 0
-    await _render_blacklist_page(callback, page)
+    m = _CB_BLACKLIST_PAGE.fullmatch(callback.data)
+    await _render_blacklist_page(callback, int(m.group(1)) if m else 0)
     await callback.answer()
 
 
+def _format_blacklist_row(r: dict) -> str:
+    return f"• `{r['user_id']}` — {r.get('reason') or '—'}"
+
+
 async def _render_blacklist_page(callback: CallbackQuery, page: int):
-    total = await GlobalBlacklist.count()
+    total = await _cached_count(("blacklist",), GlobalBlacklist.count)
     rows = await GlobalBlacklist.get_all(page, PER_PAGE_BLACKLIST)
-    lines = [f"• `{r['user_id']}` — {r.get('reason') or '—'}" for r in rows]
     text = (
         "🚫 **Czarna lista**\n\n"
-        + ("\n".join(lines) if lines else "_Pusta_")
+        + ("\n".join(map(_format_blacklist_row, rows)) or "_Pusta_")
         + f"\n\nStrona {page + 1}/{(max(1, total) + PER_PAGE_BLACKLIST - 1) // PER_PAGE_BLACKLIST or 1} (łącznie: {total})"
     )
     npages = max(1, (total + PER_PAGE_BLACKLIST - 1) // PER_PAGE_BLACKLIST)
@@ -605,27 +766,20 @@ async def _render_blacklist_page(callback: CallbackQuery, page: int):
         kb.append([InlineKeyboardButton(text="◀", callback_data=f"superadmin_blacklist_page_{page - 1}")])
     if page < npages - 1:
         kb.append([InlineKeyboardButton(text="▶", callback_data=f"superadmin_blacklist_page_{page + 1}")])
-    kb.append([InlineKeyboardButton(text="➕ Dodaj user_id", callback_data="superadmin_blacklist_add")])
-    kb.append([InlineKeyboardButton(text="➕ Ban + opuść kanały", callback_data="superadmin_blacklist_add_full")])
-    for r in rows:
-        uid = r["user_id"]
-        kb.append([InlineKeyboardButton(text=f"❌ Usuń {uid}", callback_data=f"superadmin_blacklist_remove_{uid}")])
-    kb.append([InlineKeyboardButton(text="🔙 Wróć", callback_data="superadmin_protection")])
+    kb.extend(_BLACKLIST_ADD_ROWS)
+    kb.extend(
+        [InlineKeyboardButton(text=f"❌ Usuń {r['user_id']}", callback_data=f"superadmin_blacklist_remove_{r['user_id']}")]
+        for r in rows
+    )
+    kb.append(_BACK_TO_PROTECTION_ROW)
     try:
-        await callback.message.edit_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=kb),
-            parse_mode=ParseMode.MARKDOWN,
-        )
+        await _edit_render(callback, text, InlineKeyboardMarkup(inline_keyboard=kb), ParseMode.MARKDOWN)
     except TelegramBadRequest:
         pass
 
 
 @superadmin_router.callback_query(F.data == "superadmin_blacklist_add")
 async def superadmin_blacklist_add_start(callback: CallbackQuery, state: FSMContext):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     await state.set_state(SuperAdminBlacklist.waiting_user_id)
     await callback.message.edit_text("Podaj **user_id** (liczbę) do dodania do czarnej listy:", parse_mode=ParseMode.MARKDOWN)
     await callback.answer()
@@ -633,14 +787,13 @@ async def superadmin_blacklist_add_start(callback: CallbackQuery, state: FSMCont
 
 @superadmin_router.message(StateFilter(SuperAdminBlacklist.waiting_user_id), F.text)
 async def superadmin_blacklist_add_apply(message: Message, state: FSMContext):
-    if not _is_admin(message.from_user.id):
-        return
     try:
         uid = int(message.text.strip())
         if settings.is_superadmin(uid):
             await message.reply("Nie możesz zbanować superadmina.")
             return
         await GlobalBlacklist.add(uid)
+        _invalidate_counts("blacklist")
         await state.clear()
         await message.reply(f"✅ Dodano `{uid}` do czarnej listy.", parse_mode=ParseMode.MARKDOWN)
     except ValueError:
@@ -649,9 +802,6 @@ async def superadmin_blacklist_add_apply(message: Message, state: FSMContext):
 
 @superadmin_router.callback_query(F.data == "superadmin_blacklist_add_full")
 async def superadmin_blacklist_add_full_start(callback: CallbackQuery, state: FSMContext):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     await state.set_state(SuperAdminBlacklist.waiting_user_id_full)
     await callback.message.edit_text(
         "Podaj **user_id** (liczbę): użytkownik zostanie dodany do czarnej listy, "
@@ -663,8 +813,6 @@ async def superadmin_blacklist_add_full_start(callback: CallbackQuery, state: FS
 
 @superadmin_router.message(StateFilter(SuperAdminBlacklist.waiting_user_id_full), F.text)
 async def superadmin_blacklist_add_full_apply(message: Message, state: FSMContext, bot: Bot):
-    if not _is_admin(message.from_user.id):
-        return
     try:
         uid = int(message.text.strip())
         if settings.is_superadmin(uid):
@@ -672,33 +820,48 @@ async def superadmin_blacklist_add_full_apply(message: Message, state: FSMContex
             await state.clear()
             return
         await GlobalBlacklist.add(uid)
-        channels = await ChannelManager.get_user_channels(uid)
-        left = 0
-        for ch in channels:
-            try:
-                cid = ch.get("channel_id")
-                if cid:
-                    await bot.leave_chat(cid)
-                    left += 1
-            except Exception as e:
-                logger.warning("leave_chat %s: %s", cid, e)
+        _invalidate_counts("blacklist")
         await state.clear()
-        await message.reply(
-            f"✅ Zbanowano `{uid}` i opuszczono **{left}** kanałów.",
+        # Kanały opuszczane w tle – admin od razu dostaje odpowiedź, wynik pojawi się w tej wiadomości
+        status = await message.reply(
+            f"✅ Ban dodany dla `{uid}`. Opuszczam kanały w tle…",
             parse_mode=ParseMode.MARKDOWN,
         )
+        _spawn(_leave_all_channels(bot, uid, status))
     except ValueError:
         await message.reply("Podaj poprawną liczbę (user_id).")
 
 
+async def _leave_all_channels(bot: Bot, uid: int, status: Message) -> None:
+    """Opuszczenie wszystkich kanałów zbanowanego właściciela (limit 10 naraz) i raport w wiadomości statusu."""
+    channels = await ChannelManager.get_user_channels(uid)
+    sem = asyncio.Semaphore(10)
+
+    async def _leave(cid) -> bool:
+        async with sem:
+            try:
+                await bot.leave_chat(cid)
+                return True
+            except Exception as e:
+                logger.warning("leave_chat %s: %s", cid, e)
+                return False
+
+    results = await asyncio.gather(*(_leave(ch["channel_id"]) for ch in channels if ch.get("channel_id")))
+    try:
+        await status.edit_text(
+            f"✅ Zbanowano `{uid}` i opuszczono **{sum(results)}** kanałów.",
+            parse_mode=ParseMode.MARKDOWN,
+        )
+    except Exception as e:
+        logger.warning("blacklist_add_full status: %s", e)
+
+
 @superadmin_router.callback_query(F.data.startswith("superadmin_blacklist_remove_"))
 async def superadmin_blacklist_remove(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     try:
         uid = int(callback.data.split("_")[-1])
         await GlobalBlacklist.remove(uid)
+        _invalidate_counts("blacklist")
         await callback.answer("Usunięto z czarnej listy.", show_alert=True)
         await _render_blacklist_page(callback, 0)
     except (ValueError, IndexError):
@@ -706,19 +869,40 @@ async def superadmin_blacklist_remove(callback: CallbackQuery):
 
 
 # ---------- Broadcast (tylko użytkownicy bota) ----------
+_BROADCAST_RATE = 30  # wiadomości/s – globalny limit Bot API
+# Wiadomości w locie – nie więcej niż połączeń w puli sesji, inaczej żądania czekają na wolne gniazdo
+_BROADCAST_CONCURRENCY = min(25, settings.HTTP_POOL_LIMIT)
+# Znaczniki legacy Markdown (ParseMode.MARKDOWN) – treść bez encji, ale z nimi, idzie z parse_mode
+_MARKDOWN_CHARS = ("*", "_", "`", "[")
+
+
+class _RateLimiter:
+    """Minimalny limiter: kolejne wejścia rozłożone co 1/rate s (zamiast sleep po każdej wysyłce)."""
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        async with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+                now = self._next
+            self._next = now + self._interval
+
+    async def __aexit__(self, *exc):
+        return False
+
+
 @superadmin_router.callback_query(F.data == "superadmin_broadcast")
 async def superadmin_broadcast_start(callback: CallbackQuery, state: FSMContext):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     await state.clear()
-    user_ids = await BotUsersManager.get_all_user_ids()
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="❌ Anuluj", callback_data="superadmin_panel")],
-    ])
+    user_ids = await BotUsersManager.get_all_user_ids_cached()
     await callback.message.edit_text(
         f"📢 **Broadcast**\n\nOdbiorcy: **użytkownicy bota** (wszyscy, którzy kiedykolwiek użyli /start) — **{len(user_ids)}** osób.\n\nWyślij treść wiadomości (tekst lub zdjęcie z podpisem):",
-        reply_markup=keyboard,
+        reply_markup=_BROADCAST_CANCEL_KB,
         parse_mode=ParseMode.MARKDOWN,
     )
     await state.set_state(SuperAdminBroadcast.waiting_message)
@@ -727,51 +911,108 @@ async def superadmin_broadcast_start(callback: CallbackQuery, state: FSMContext)
 
 @superadmin_router.message(StateFilter(SuperAdminBroadcast.waiting_message), F.content_type.in_({ContentType.TEXT, ContentType.PHOTO}))
 async def superadmin_broadcast_message_received(message: Message, state: FSMContext, bot: Bot):
-    if not _is_admin(message.from_user.id):
-        return
+    # Formatowanie bierzemy z encji, które Telegram już policzył dla wiadomości admina –
+    # wysyłka idzie z entities (bez parse_mode), więc nic nie jest parsowane N razy ani nie wywala "can't parse entities"
     if message.content_type == ContentType.PHOTO:
-        photo = message.photo[-1]
-        caption = message.caption or ""
-        await state.update_data(broadcast_photo_file_id=photo.file_id, broadcast_text=caption)
+        photo_id, text, entities = message.photo[-1].file_id, message.caption or "", message.caption_entities
     else:
-        await state.update_data(broadcast_photo_file_id=None, broadcast_text=message.text or "")
+        photo_id, text, entities = None, message.text or "", message.entities
+    # Bez encji, ale z ręcznie wpisanym *pogrubieniem* / _kursywą_ – wysyłka jak dotąd z parse_mode=MARKDOWN
+    markdown = not entities and any(c in text for c in _MARKDOWN_CHARS)
+    # Migawka odbiorców – potwierdzenie wyśle dokładnie do tej listy (bez ponownego zapytania);
+    # treść i lista zapisywane jednym update_data (jeden zapis do storage FSM)
+    user_ids = await BotUsersManager.get_all_user_ids_cached()
+    await state.update_data(
+        broadcast_photo_file_id=photo_id,
+        broadcast_text=text,
+        broadcast_entities=[e.model_dump(exclude_none=True) for e in entities or ()],
+        broadcast_markdown=markdown,
+        broadcast_from_chat_id=message.chat.id,
+        broadcast_msg_id=message.message_id,
+        broadcast_user_ids=list(user_ids),
+    )
     await state.set_state(SuperAdminBroadcast.waiting_confirm)
-    user_ids = await BotUsersManager.get_all_user_ids()
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Wyślij", callback_data="superadmin_bc_confirm_yes")],
-        [InlineKeyboardButton(text="❌ Anuluj", callback_data="superadmin_bc_confirm_no")],
-    ])
     await message.reply(
         f"Odbiorcy: **użytkownicy bota** ({len(user_ids)} osób). Potwierdź wysyłkę:",
-        reply_markup=keyboard,
+        reply_markup=_BROADCAST_CONFIRM_KB,
         parse_mode=ParseMode.MARKDOWN,
     )
 
 
 @superadmin_router.callback_query(StateFilter(SuperAdminBroadcast.waiting_confirm), F.data == "superadmin_bc_confirm_yes")
 async def superadmin_broadcast_confirm_yes(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     await callback.answer("Wysyłam…")
     data = await state.get_data()
     text = data.get("broadcast_text", "")
     photo_id = data.get("broadcast_photo_file_id")
-    user_ids = await BotUsersManager.get_all_user_ids()
+    entities = [MessageEntity(**e) for e in data.get("broadcast_entities") or ()] or None
+    from_chat_id = data.get("broadcast_from_chat_id")
+    msg_id = data.get("broadcast_msg_id")
+    markdown = data.get("broadcast_markdown", False)
+    user_ids = data.get("broadcast_user_ids") or await BotUsersManager.get_all_user_ids_cached()
     await callback.message.edit_text("Wysyłam…")
-    sent = 0
-    failed = 0
-    import asyncio
-    for uid in user_ids:
+    # Równolegle (do _BROADCAST_CONCURRENCY w locie), ale nie szybciej niż globalny limit Telegrama ~30 wiadomości/s
+    limiter = _RateLimiter(_BROADCAST_RATE)
+    sem = asyncio.Semaphore(_BROADCAST_CONCURRENCY)
+    done = 0
+
+    # copyMessage z wiadomości admina (Telegram nie rozwiązuje pliku ani formatowania od nowa);
+    # gdy źródło zostało usunięte – wysyłka z zapisanej treści jak dotąd.
+    # Treść z Markdownem nie jest kopiowana (kopia miałaby dosłowne gwiazdki) – idzie z parse_mode=MARKDOWN
+    copy_ok = not markdown and from_chat_id is not None and msg_id is not None
+
+    async def _deliver(uid: int) -> None:
+        nonlocal copy_ok, markdown
+        if markdown:
+            try:
+                if photo_id:
+                    await bot.send_photo(uid, photo_id, caption=text or None, parse_mode=ParseMode.MARKDOWN)
+                else:
+                    await bot.send_message(uid, text or "-", parse_mode=ParseMode.MARKDOWN)
+                return
+            except TelegramBadRequest as e:
+                # Błędny Markdown jest błędny dla wszystkich – reszta odbiorców dostaje zwykły tekst
+                if "can't parse entities" not in str(e).lower():
+                    raise
+                markdown = False
+        if copy_ok:
+            try:
+                await bot.copy_message(chat_id=uid, from_chat_id=from_chat_id, message_id=msg_id)
+                return
+            except TelegramBadRequest as e:
+                # Tylko usunięte źródło wyłącza kopiowanie; "chat not found" to zwykły martwy odbiorca
+                if "message to copy not found" not in str(e).lower():
+                    raise
+                copy_ok = False
+        if photo_id:
+            await bot.send_photo(uid, photo_id, caption=text or None, caption_entities=entities, parse_mode=None)
+        else:
+            await bot.send_message(uid, text or "-", entities=entities, parse_mode=None)
+
+    async def _send_one(uid: int) -> bool:
+        nonlocal done
         try:
-            if photo_id:
-                await bot.send_photo(uid, photo_id, caption=text or None, parse_mode=ParseMode.MARKDOWN)
-            else:
-                await bot.send_message(uid, text or "-", parse_mode=ParseMode.MARKDOWN)
-            sent += 1
+            async with sem:
+                async with limiter:
+                    try:
+                        await _deliver(uid)
+                    except TelegramRetryAfter as e:
+                        await asyncio.sleep(e.retry_after)
+                        await _deliver(uid)
+            return True
         except Exception:
-            failed += 1
-        await asyncio.sleep(0.05)
+            return False
+        finally:
+            done += 1
+            if done % 500 == 0:
+                try:
+                    await callback.message.edit_text(f"Wysyłam… {done}/{len(user_ids)}")
+                except TelegramBadRequest:
+                    pass
+
+    results = await asyncio.gather(*(_send_one(uid) for uid in user_ids))
+    sent = sum(results)
+    failed = len(results) - sent
     await state.clear()
     await callback.message.edit_text(
         f"✅ Broadcast zakończony.\nWysłano: **{sent}**, nieudane: **{failed}**",
@@ -781,9 +1022,6 @@ async def superadmin_broadcast_confirm_yes(callback: CallbackQuery, state: FSMCo
 
 @superadmin_router.callback_query(StateFilter(SuperAdminBroadcast.waiting_confirm), F.data == "superadmin_bc_confirm_no")
 async def superadmin_broadcast_confirm_no(callback: CallbackQuery, state: FSMContext):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     await state.clear()
     await callback.message.edit_text("Anulowano.")
     await callback.answer()
@@ -792,28 +1030,12 @@ async def superadmin_broadcast_confirm_no(callback: CallbackQuery, state: FSMCon
 # ---------- Inbox (info + obsługa Odpowiedz / Wycisz) ----------
 @superadmin_router.callback_query(F.data == "superadmin_inbox_info")
 async def superadmin_inbox_info(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
-    await callback.message.edit_text(
-        "📩 **Inbox**\n\n"
-        "Gdy użytkownik pisze do bota wiadomość (prywatnie, nie komendę), "
-        "dostaniesz ją tutaj z przyciskami **Odpowiedz** i **Wycisz**.\n\n"
-        "• **Odpowiedz** — napiszesz wiadomość, która zostanie wysłana do tego użytkownika.\n"
-        "• **Wycisz** — przestaniesz dostawać powiadomienia od tego użytkownika.",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔙 Menu", callback_data="superadmin_panel")],
-        ]),
-        parse_mode=ParseMode.MARKDOWN,
-    )
+    await callback.message.edit_text(**_INBOX_INFO_MSG, reply_markup=_BACK_TO_PANEL_KB)
     await callback.answer()
 
 
 @superadmin_router.callback_query(F.data.startswith("inbox_reply_"))
 async def inbox_reply_start(callback: CallbackQuery, state: FSMContext):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     try:
         uid = int(callback.data.replace("inbox_reply_", ""))
         await state.set_state(SuperAdminInbox.waiting_reply_to_user)
@@ -826,8 +1048,6 @@ async def inbox_reply_start(callback: CallbackQuery, state: FSMContext):
 
 @superadmin_router.message(StateFilter(SuperAdminInbox.waiting_reply_to_user), F.text)
 async def inbox_reply_send(message: Message, state: FSMContext, bot: Bot):
-    if not _is_admin(message.from_user.id):
-        return
     if message.text and message.text.strip() == "/start":
         await state.clear()
         await message.reply("Anulowano. Odpowiedź nie została wysłana.")
@@ -848,9 +1068,6 @@ async def inbox_reply_send(message: Message, state: FSMContext, bot: Bot):
 
 @superadmin_router.callback_query(F.data.startswith("inbox_mute_"))
 async def inbox_mute(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     try:
         uid = int(callback.data.replace("inbox_mute_", ""))
         await InboxMuted.add(uid)
@@ -860,24 +1077,33 @@ async def inbox_mute(callback: CallbackQuery):
 
 
 # ---------- Konsolka (logi) ----------
+_LOG_SANITIZE = str.maketrans({"`": "'"})
+_CONSOLE_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🔄 Odśwież", callback_data="superadmin_console")],
+    [InlineKeyboardButton(text="🔙 Menu", callback_data="superadmin_panel")],
+])
+
+
 @superadmin_router.callback_query(F.data == "superadmin_console")
 async def superadmin_console(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     try:
-        from utils.log_buffer import get_recent_lines
-        lines = get_recent_lines(40)
-        safe = [(l or "").replace("`", "'")[:200] for l in lines]
-        block = "\n".join(safe) if safe else "(brak)"
+        # Od najnowszego; odwracamy raz już po obcięciu/sanityzacji
+        safe = [(l or "")[:200].translate(_LOG_SANITIZE) for l in recent_lines_newest_first(40)]
+        block = "\n".join(reversed(safe)) if safe else "(brak)"
         text = "📜 **Konsolka (ostatnie logi)**\n\n```\n" + block + "\n```"
         if len(text) > 4000:
-            text = "📜 **Konsolka**\n\n```\n" + "\n".join(safe[-35:]) + "\n```"
-        kb = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔄 Odśwież", callback_data="superadmin_console")],
-            [InlineKeyboardButton(text="🔙 Menu", callback_data="superadmin_panel")],
-        ])
-        await callback.message.edit_text(text, reply_markup=kb, parse_mode=ParseMode.MARKDOWN)
+            text = "📜 **Konsolka**\n\n```\n" + "\n".join(reversed(safe[:35])) + "\n```"
+        # Odśwież bez nowych logów – bez edit_text (podpis treści w _edit_render)
+        if not await _edit_render(callback, text, _CONSOLE_KB, ParseMode.MARKDOWN):
+            await callback.answer("Brak nowych logów")
+            return
+    except TelegramBadRequest as e:
+        # Brak podpisu w pamięci (np. po restarcie) – Telegram odrzuca identyczną treść; to nie błąd
+        if "not modified" in str(e):
+            await callback.answer("Brak nowych logów")
+            return
+        logger.exception("console: %s", e)
+        await callback.message.edit_text(f"❌ Błąd: {e}")
     except Exception as e:
         logger.exception("console: %s", e)
         await callback.message.edit_text(f"❌ Błąd: {e}")
@@ -887,24 +1113,12 @@ async def superadmin_console(callback: CallbackQuery):
 # ---------- Narzędzia ----------
 @superadmin_router.callback_query(F.data == "superadmin_tools")
 async def superadmin_tools(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔍 Sprawdź wygasłe subskrypcje", callback_data="superadmin_tool_check_expired")],
-        [InlineKeyboardButton(text="🔄 SFS autofill", callback_data="superadmin_tool_sfs_autofill")],
-        [InlineKeyboardButton(text="🚫 Join requesty (free) — sprawdź / usuń", callback_data="superadmin_join_requests_menu")],
-        [InlineKeyboardButton(text="🔙 Menu", callback_data="superadmin_panel")],
-    ])
-    await callback.message.edit_text("🔧 **Narzędzia**\n\nWybierz akcję:", reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
+    await callback.message.edit_text(**_TOOLS_MSG, reply_markup=_TOOLS_KB)
     await callback.answer()
 
 
 @superadmin_router.callback_query(F.data == "superadmin_tool_check_expired")
 async def superadmin_tool_check_expired(callback: CallbackQuery, scheduler: BotScheduler):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     await callback.answer("Sprawdzam…")
     try:
         await scheduler.check_expired_subscriptions()
@@ -916,12 +1130,8 @@ async def superadmin_tool_check_expired(callback: CallbackQuery, scheduler: BotS
 
 @superadmin_router.callback_query(F.data == "superadmin_tool_sfs_autofill")
 async def superadmin_tool_sfs_autofill(callback: CallbackQuery, bot: Bot):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     await callback.answer("Uruchamiam SFS autofill…")
     try:
-        from handlers.sfs import run_update_sfs_members_count
         await run_update_sfs_members_count(bot)
         await callback.message.answer("✅ SFS autofill zakończony.")
     except Exception as e:
@@ -932,19 +1142,11 @@ async def superadmin_tool_sfs_autofill(callback: CallbackQuery, bot: Bot):
 # ---------- Join requesty (free) — tylko własne kanały superadmina ----------
 @superadmin_router.callback_query(F.data == "superadmin_join_requests_menu")
 async def superadmin_join_requests_menu(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📋 Sprawdź wszystkie (na moich free)", callback_data="superadmin_join_list")],
-        [InlineKeyboardButton(text="🚫 Usuń wszystkie (na wybranym free)", callback_data="superadmin_join_decline_all")],
-        [InlineKeyboardButton(text="🔙 Narzędzia", callback_data="superadmin_tools")],
-    ])
     await callback.message.edit_text(
         "🚫 **Join requesty (free)**\n\nDziałania tylko na **Twoich** kanałach free.\n\n"
         "• **Sprawdź wszystkie** — lista oczekujących wniosków na każdym Twoim free kanale.\n"
         "• **Usuń wszystkie** — odrzucenie wszystkich wniosków na wybranym free kanale.",
-        reply_markup=keyboard,
+        reply_markup=_JOIN_MENU_KB,
         parse_mode=ParseMode.MARKDOWN,
     )
     await callback.answer()
@@ -953,53 +1155,41 @@ async def superadmin_join_requests_menu(callback: CallbackQuery):
 @superadmin_router.callback_query(F.data == "superadmin_join_list")
 async def superadmin_join_list(callback: CallbackQuery):
     """Sprawdź wszystkie oczekujące join requesty na własnych free kanałach."""
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     user_id = callback.from_user.id
-    channels = await ChannelManager.get_user_channels(user_id)
-    free_channels = [ch for ch in channels if ch["type"] == "free"]
+    free_channels = await ChannelManager.get_user_channels_by_type(user_id, "free")
+    pending_by_cid = get_pending_join_requests_bulk([ch["channel_id"] for ch in free_channels])
     lines = []
     for ch in free_channels:
         cid = ch["channel_id"]
         title = (ch.get("title") or "Kanał")[:40]
-        pending = get_pending_join_requests(cid)
+        pending = pending_by_cid.get(cid, [])
         lines.append(f"🆓 **{title}** — {len(pending)} wniosków")
         for r in pending[:10]:
             lines.append(f"  • {r.get('full_name', '—')} (@{r.get('username', '—')}) `{r['user_id']}`")
         if len(pending) > 10:
             lines.append(f"  … i {len(pending) - 10} kolejnych")
     text = "📋 **Oczekujące join requesty (Twoje free kanały)**\n\n" + ("\n".join(lines) if lines else "_Brak free kanałów lub brak wniosków._")
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Join requesty", callback_data="superadmin_join_requests_menu")],
-        [InlineKeyboardButton(text="🔙 Narzędzia", callback_data="superadmin_tools")],
-    ])
-    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
+    await callback.message.edit_text(text, reply_markup=_JOIN_BACK_KB, parse_mode=ParseMode.MARKDOWN)
     await callback.answer()
 
 
 @superadmin_router.callback_query(F.data == "superadmin_join_decline_all")
 async def superadmin_join_decline_all(callback: CallbackQuery):
     """Wybierz własny free kanał, z którego usunąć wszystkie join requesty."""
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     user_id = callback.from_user.id
-    channels = await ChannelManager.get_user_channels(user_id)
-    free_channels = [ch for ch in channels if ch["type"] == "free"]
+    free_channels = await ChannelManager.get_user_channels_by_type(user_id, "free")
     if not free_channels:
         await callback.message.edit_text(
             "Brak Twoich kanałów free.",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔙 Join requesty", callback_data="superadmin_join_requests_menu")],
-            ]),
+            reply_markup=_JOIN_MENU_BACK_KB,
         )
         await callback.answer()
         return
+    pending_by_cid = get_pending_join_requests_bulk([ch["channel_id"] for ch in free_channels])
     keyboard = []
     for ch in free_channels:
         cid = ch["channel_id"]
-        pending = get_pending_join_requests(cid)
+        pending = pending_by_cid.get(cid, [])
         label = f"🆓 {ch.get('title', 'Kanał')[:28]} ({len(pending)})"
         keyboard.append([InlineKeyboardButton(text=label, callback_data=f"superadmin_join_decline_ch_{cid}")])
     keyboard.append([InlineKeyboardButton(text="🔙 Wróć", callback_data="superadmin_join_requests_menu")])
@@ -1013,9 +1203,6 @@ async def superadmin_join_decline_all(callback: CallbackQuery):
 @superadmin_router.callback_query(F.data.startswith("superadmin_join_decline_ch_"))
 async def superadmin_join_decline_channel_all(callback: CallbackQuery, bot: Bot):
     """Odrzuć wszystkie join requesty na wybranym własnym free kanale."""
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     try:
         channel_id = int(callback.data.replace("superadmin_join_decline_ch_", ""))
     except ValueError:
@@ -1030,21 +1217,28 @@ async def superadmin_join_decline_channel_all(callback: CallbackQuery, bot: Bot)
         await callback.answer("Brak wniosków na tym kanale.", show_alert=True)
         return
     await callback.answer("Odrzucam…")
-    declined = 0
-    for r in pending:
-        try:
-            await bot.decline_chat_join_request(chat_id=channel_id, user_id=r["user_id"])
-            pop_pending_join_request(channel_id, r["user_id"])
-            declined += 1
-        except Exception as e:
-            logger.warning("decline_chat_join_request %s %s: %s", channel_id, r["user_id"], e)
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Join requesty", callback_data="superadmin_join_requests_menu")],
-        [InlineKeyboardButton(text="🔙 Narzędzia", callback_data="superadmin_tools")],
-    ])
+    # Odrzucanie równolegle (limit 10 naraz); pop_pending_join_request działa synchronicznie w pętli zdarzeń
+    sem = asyncio.Semaphore(10)
+
+    async def _decline(uid: int) -> bool:
+        async with sem:
+            try:
+                try:
+                    await bot.decline_chat_join_request(chat_id=channel_id, user_id=uid)
+                except TelegramRetryAfter as e:
+                    await asyncio.sleep(e.retry_after)
+                    await bot.decline_chat_join_request(chat_id=channel_id, user_id=uid)
+                pop_pending_join_request(channel_id, uid)
+                return True
+            except Exception as e:
+                logger.warning("decline_chat_join_request %s %s: %s", channel_id, uid, e)
+                return False
+
+    results = await asyncio.gather(*(_decline(r["user_id"]) for r in pending))
+    declined = sum(results)
     await callback.message.edit_text(
         f"✅ Odrzucono **{declined}** wniosków na wybranym kanale.",
-        reply_markup=keyboard,
+        reply_markup=_JOIN_BACK_KB,
         parse_mode=ParseMode.MARKDOWN,
     )
 
@@ -1052,33 +1246,64 @@ async def superadmin_join_decline_channel_all(callback: CallbackQuery, bot: Bot)
 # ---------- Strefa niebezpieczna (eksport) ----------
 @superadmin_router.callback_query(F.data == "superadmin_danger")
 async def superadmin_danger(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📥 Eksport: Kanały", callback_data="superadmin_export_channels")],
-        [InlineKeyboardButton(text="📥 Eksport: Subskrypcje", callback_data="superadmin_export_subs")],
-        [InlineKeyboardButton(text="🔙 Menu", callback_data="superadmin_panel")],
-    ])
-    await callback.message.edit_text(
-        "⚠️ **Strefa niebezpieczna**\n\nEksport danych (CSV/JSON):",
-        reply_markup=keyboard,
-        parse_mode=ParseMode.MARKDOWN,
-    )
+    await callback.message.edit_text(**_DANGER_MSG, reply_markup=_DANGER_KB)
     await callback.answer()
 
 
+def _iso(value) -> str | None:
+    """Data jako ISO (asyncpg daje datetime, SQLite już string ISO) – jednolity format w eksporcie."""
+    if not value:
+        return None
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _export_json(rows) -> bytes:
+    """
+    Tablica JSON zapisywana wiersz po wierszu do bufora (bez budowania listy i jednego wielkiego dumps).
+    orjson gdy zainstalowany, inaczej json ze stdlib.
+    """
+    buf = io.BytesIO()
+    buf.write(b"[")
+    first = True
+    for row in rows:
+        buf.write(b"\n  " if first else b",\n  ")
+        first = False
+        if orjson is not None:
+            buf.write(orjson.dumps(row))
+        else:
+            buf.write(json.dumps(row, ensure_ascii=False).encode("utf-8"))
+    buf.write(b"\n]" if not first else b"]")
+    return buf.getvalue()
+
+
+# Budowa payloadów eksportu w wątku (asyncio.to_thread) – tysiące wierszy nie blokują pętli zdarzeń
+def _build_channels_payload(channels: list) -> bytes:
+    return _export_json(
+        {"channel_id": c["channel_id"], "owner_id": c["owner_id"], "title": c.get("title"), "type": c.get("type")}
+        for c in channels
+    )
+
+
+# Kolumny subskrypcji w eksporcie (SELECT * z tabeli subscriptions – wszystkie zawsze obecne)
+_SUB_EXPORT_KEYS = ("user_id", "channel_id", "owner_id", "username", "full_name", "tier", "status")
+_sub_export_get = itemgetter(*_SUB_EXPORT_KEYS)
+
+
+def _build_subs_payload(subs: list) -> bytes:
+    keys, get = _SUB_EXPORT_KEYS, _sub_export_get
+    return _export_json(
+        {**dict(zip(keys, get(s))), "end_date": _iso(s["end_date"])}
+        for s in subs
+    )
+
+
 @superadmin_router.callback_query(F.data == "superadmin_export_channels")
 async def superadmin_export_channels(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     await callback.answer("Generuję…")
     try:
         channels = await ChannelManager.get_all_channels(0, 10000, None)
-        rows = [{"channel_id": c["channel_id"], "owner_id": c["owner_id"], "title": c.get("title"), "type": c.get("type")} for c in channels]
-        buf = io.BytesIO(json.dumps(rows, ensure_ascii=False, indent=2).encode("utf-8"))
-        await callback.message.answer_document(BufferedInputFile(buf.getvalue(), filename="channels_export.json"))
+        payload = await asyncio.to_thread(_build_channels_payload, channels)
+        await callback.message.answer_document(BufferedInputFile(payload, filename="channels_export.json"))
     except Exception as e:
         logger.exception("export channels: %s", e)
         await callback.message.answer(f"❌ Błąd: {e}")
@@ -1086,26 +1311,11 @@ async def superadmin_export_channels(callback: CallbackQuery):
 
 @superadmin_router.callback_query(F.data == "superadmin_export_subs")
 async def superadmin_export_subs(callback: CallbackQuery):
-    if not _is_admin(callback.from_user.id):
-        await callback.answer("🚫 Brak dostępu.", show_alert=True)
-        return
     await callback.answer("Generuję…")
     try:
         subs = await SubscriptionManager.get_all_subscriptions_paginated(None, 0, 10000)
-        rows = []
-        for s in subs:
-            rows.append({
-                "user_id": s.get("user_id"),
-                "channel_id": s.get("channel_id"),
-                "owner_id": s.get("owner_id"),
-                "username": s.get("username"),
-                "full_name": s.get("full_name"),
-                "tier": s.get("tier"),
-                "status": s.get("status"),
-                "end_date": str(s.get("end_date")) if s.get("end_date") else None,
-            })
-        buf = io.BytesIO(json.dumps(rows, ensure_ascii=False, indent=2).encode("utf-8"))
-        await callback.message.answer_document(BufferedInputFile(buf.getvalue(), filename="subscriptions_export.json"))
+        payload = await asyncio.to_thread(_build_subs_payload, subs)
+        await callback.message.answer_document(BufferedInputFile(payload, filename="subscriptions_export.json"))
     except Exception as e:
         logger.exception("export subs: %s", e)
         await callback.message.answer(f"❌ Błąd: {e}")
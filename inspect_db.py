@@ -8,11 +8,15 @@ async def inspect():
     print(f"Inspecting DB at: {db_path}")
     
     async with aiosqlite.connect(db_path) as db:
+        # Te same ustawienia co połączenie bota (database/connection.py) – WAL nie blokuje działającego bota
+        await db.execute("PRAGMA journal_mode=WAL")
+        await db.execute("PRAGMA synchronous=NORMAL")
+        await db.execute("PRAGMA temp_store=MEMORY")
+        await db.execute("PRAGMA mmap_size=268435456")
         async with db.execute("PRAGMA table_info(subscriptions)") as cursor:
             columns = await cursor.fetchall()
             print("Columns in 'subscriptions' table:")
-            for col in columns:
-                print(col)
+            print("\n".join(map(str, columns)))
 
 if __name__ == "__main__":
     asyncio.run(inspect())
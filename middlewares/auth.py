@@ -2,15 +2,34 @@
 Middleware do autoryzacji admina i logowania zapytań
 """
 import logging
+import time
+from collections import OrderedDict
 from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
 
 from config import settings
+from database.connection import db_manager
+from database.models import GlobalBlacklist, SettingsManager
 from utils.helpers import validate_admin_command
+from utils.write_queue import enqueue_user, enqueue_interaction
 
 logger = logging.getLogger("middlewares")
 
+# Odmowa zależnie od typu zdarzenia: wiadomość – odpowiedź, callback – alert.
+# Jeden lookup po type(event) zamiast łańcucha isinstance w każdym middleware.
+_REJECTORS = {
+    Message: lambda event, text, alert_text: event.reply(text),
+    CallbackQuery: lambda event, text, alert_text: event.answer(alert_text, show_alert=True),
+}
+
+
+async def _reject(event: TelegramObject, text: str, alert_text: str) -> None:
+    """Powiadomienie o odrzuceniu zdarzenia (inne typy zdarzeń – bez odpowiedzi)."""
+    rejector = _REJECTORS.get(type(event))
+    if rejector is not None:
+        await rejector(event, text, alert_text)
+
 
 class AuthMiddleware(BaseMiddleware):
     """
@@ -25,8 +44,6 @@ class AuthMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        from database.models import GlobalBlacklist, SettingsManager
-        
         user_id = getattr(getattr(event, "from_user", None), "id", None)
         if user_id is None:
             return await handler(event, data)
@@ -37,23 +54,38 @@ class AuthMiddleware(BaseMiddleware):
         
         # Czarna lista (nie blokujemy superadminów)
         if await GlobalBlacklist.is_banned(user_id):
-            if isinstance(event, Message):
-                await event.reply("🚫 Jesteś zablokowany.")
-            elif isinstance(event, CallbackQuery):
-                await event.answer("🚫 Jesteś zablokowany.", show_alert=True)
+            await _reject(event, "🚫 Jesteś zablokowany.", "🚫 Jesteś zablokowany.")
             return
         
         # Tryb konserwacji
         if await SettingsManager.get_maintenance_mode():
-            if isinstance(event, Message):
-                await event.reply("🔧 Bot w konserwacji. Spróbuj później.")
-            elif isinstance(event, CallbackQuery):
-                await event.answer("🔧 Bot w konserwacji.", show_alert=True)
+            await _reject(event, "🔧 Bot w konserwacji. Spróbuj później.", "🔧 Bot w konserwacji.")
             return
         
         return await handler(event, data)
 
 
+class SuperAdminOnlyMiddleware(BaseMiddleware):
+    """
+    Bramka dla routera super-admina (callback_query i message, middleware wewnętrzne – działa tylko po dopasowaniu filtrów).
+    Nie-superadmin dostaje alert „Brak dostępu” (na komendę – odpowiedź), handler nie jest wywoływany.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user_id = getattr(getattr(event, "from_user", None), "id", None)
+        if user_id is not None and settings.is_superadmin(user_id):
+            return await handler(event, data)
+        # Na zwykły tekst (np. w stanie FSM) nie odpowiadamy – tylko na komendę
+        if type(event) is not Message or (event.text or "").startswith("/"):
+            await _reject(event, "🚫 Brak dostępu.", "🚫 Brak dostępu.")
+        return
+
+
 class LoggingMiddleware(BaseMiddleware):
     """
     Middleware do szczegółowego logowania wszystkich zdarzeń
@@ -67,7 +99,8 @@ class LoggingMiddleware(BaseMiddleware):
     ) -> Any:
         """Logowanie zdarzeń"""
         
-        event_type = type(event).__name__
+        event_cls = type(event)
+        event_type = event_cls.__name__
         
         # Szczegółowe logowanie różnych typów zdarzeń
         try:
@@ -83,28 +116,26 @@ class LoggingMiddleware(BaseMiddleware):
             
             logger.debug(f"{event_type}: {user_info}, {chat_info}")
 
-            # Przed handlerem: zapisz użytkownika i log interakcji (żeby panel „Aktywni użytkownicy” miał dane nawet gdy handler się wywali)
+            # Przed handlerem: zapisz użytkownika i log interakcji (żeby panel „Aktywni użytkownicy” miał dane nawet gdy handler się wywali).
+            # Tylko kolejka w pamięci – zapis do bazy paczkami w tle (utils.write_queue), handler nie czeka na bazę
             try:
                 user_id = getattr(getattr(event, "from_user", None), "id", None)
                 from_user = getattr(event, "from_user", None)
                 if user_id and from_user:
-                    from database.models import BotUsersManager
                     username = from_user.username if from_user else None
                     full_name = ((from_user.first_name or "") + " " + (from_user.last_name or "")).strip() if from_user else None
                     if not full_name and from_user:
                         full_name = from_user.first_name or None
-                    await BotUsersManager.ensure_user(user_id)
-                    await BotUsersManager.update_user_display_info(user_id, username=username, full_name=full_name)
+                    enqueue_user(user_id, username, full_name)
                     if not settings.is_superadmin(user_id):
-                        from database.models import UserInteractionLog
-                        if isinstance(event, Message):
+                        if event_cls is Message:
                             chat = getattr(event, "chat", None)
                             if chat and getattr(chat, "type", None) == "private":
                                 preview = (event.text or event.caption or "")[:200] if (event.text or event.caption) else f"[{getattr(event.content_type, 'value', event.content_type)}]"
-                                await UserInteractionLog.add(user_id, "message", preview)
-                        elif isinstance(event, CallbackQuery):
+                                enqueue_interaction(user_id, "message", preview)
+                        elif event_cls is CallbackQuery:
                             preview = (event.data or "")[:200]
-                            await UserInteractionLog.add(user_id, "callback", preview)
+                            enqueue_interaction(user_id, "callback", preview)
             except Exception as upd_err:
                 logger.debug("ensure_user / interaction_log skip: %s", upd_err)
 
@@ -122,7 +153,7 @@ class LoggingMiddleware(BaseMiddleware):
             if hasattr(event, 'from_user') and event.from_user and event.from_user.id == settings.ADMIN_ID:
                 try:
                     bot = data.get('bot')
-                    if bot and isinstance(event, Message):
+                    if bot and event_cls is Message:
                         await bot.send_message(
                             chat_id=settings.ADMIN_ID,
                             text=f"⚠️ **Błąd systemu:**\n`{str(e)[:200]}`",
@@ -136,13 +167,19 @@ class LoggingMiddleware(BaseMiddleware):
 
 class RateLimitMiddleware(BaseMiddleware):
     """
-    Middleware do ograniczania liczby zapytań (rate limiting)
+    Middleware do ograniczania liczby zapytań (rate limiting).
+    Token bucket: pojemność max_requests_per_minute, uzupełnianie max_requests_per_minute / 60 na sekundę.
+    Najwyżej max_users kubełków – najdawniej widziani użytkownicy są usuwani (LRU).
     """
     
-    def __init__(self, max_requests_per_minute: int = 20):
+    def __init__(self, max_requests_per_minute: int = 20, max_users: int = 100_000):
         super().__init__()
         self.max_requests = max_requests_per_minute
-        self.user_requests = {}  # {user_id: [timestamp, timestamp, ...]}
+        self.rate = max_requests_per_minute / 60.0
+        self.capacity = float(max_requests_per_minute)
+        # {user_id: [tokeny, czas ostatniego uzupełnienia]} – dwie liczby na użytkownika (lista, by nie tworzyć krotek)
+        self.buckets: OrderedDict[int, list] = OrderedDict()
+        self.max_users = max_users
     
     async def __call__(
         self,
@@ -152,8 +189,7 @@ class RateLimitMiddleware(BaseMiddleware):
     ) -> Any:
         """Rate limiting logic"""
         
-        import time
-        current_time = time.time()
+        current_time = time.monotonic()
         
         # Pobranie user_id
         user_id = None
@@ -168,35 +204,27 @@ class RateLimitMiddleware(BaseMiddleware):
         if settings.is_superadmin(user_id):
             return await handler(event, data)
         
-        # Inicjalizacja listy zapytań dla użytkownika
-        if user_id not in self.user_requests:
-            self.user_requests[user_id] = []
-        
-        # Usunięcie starych zapytań (sprzed minuty)
-        minute_ago = current_time - 60
-        self.user_requests[user_id] = [
-            req_time for req_time in self.user_requests[user_id] 
-            if req_time > minute_ago
-        ]
+        # Uzupełnienie tokenów za czas od ostatniego zapytania
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            bucket = self.buckets[user_id] = [self.capacity, current_time]
+            while len(self.buckets) > self.max_users:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(user_id)
+        bucket[0] = min(self.capacity, bucket[0] + (current_time - bucket[1]) * self.rate)
+        bucket[1] = current_time
         
         # Sprawdzenie czy przekroczono limit
-        if len(self.user_requests[user_id]) >= self.max_requests:
+        if bucket[0] < 1.0:
             logger.warning(f"Rate limit exceeded dla użytkownika {user_id}")
             
-            if isinstance(event, Message):
-                await event.reply(
-                    "⏱️ Zbyt wiele zapytań. Poczekaj chwilę przed kolejną akcją."
-                )
-            elif isinstance(event, CallbackQuery):
-                await event.answer(
-                    "⏱️ Zbyt wiele zapytań",
-                    show_alert=True
-                )
+            await _reject(event, "⏱️ Zbyt wiele zapytań. Poczekaj chwilę przed kolejną akcją.", "⏱️ Zbyt wiele zapytań")
             
             return  # Blokowanie zapytania
         
-        # Dodanie aktualnego zapytania do listy
-        self.user_requests[user_id].append(current_time)
+        # Zużycie tokenu przez aktualne zapytanie
+        bucket[0] -= 1.0
         
         # Kontynuacja przetwarzania
         return await handler(event, data)
@@ -204,7 +232,9 @@ class RateLimitMiddleware(BaseMiddleware):
 
 class DatabaseMiddleware(BaseMiddleware):
     """
-    Middleware zapewniające dostęp do bazy danych w handlerach
+    Middleware zapewniające dostęp do bazy danych w handlerach.
+    W kontekście ląduje sam menedżer (data['db']) – handler, który potrzebuje bazy,
+    bierze połączenie przez `await db.get_connection()`; pozostałe nie płacą nic.
     """
     
     async def __call__(
@@ -213,21 +243,9 @@ class DatabaseMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        """Dodanie połączenia z bazą danych do kontekstu"""
-        
-        from database.connection import db_manager
-        
-        try:
-            # Zapewnienie połączenia z bazą danych
-            connection = await db_manager.get_connection()
-            data['db_connection'] = connection
-            
-            # Wywołanie handlera
-            return await handler(event, data)
-            
-        except Exception as e:
-            logger.error(f"Błąd middleware bazy danych: {e}")
-            raise
+        """Dodanie menedżera bazy danych do kontekstu (bez pobierania połączenia)"""
+        data['db'] = db_manager
+        return await handler(event, data)
 
 
 
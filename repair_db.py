@@ -21,6 +21,11 @@ async def repair():
     try:
         async with aiosqlite.connect(db_path) as db:
             db.row_factory = aiosqlite.Row
+
+            # Cała naprawa w jednej transakcji: jeden commit (jeden fsync) na końcu, a przy błędzie nic nie zostaje w połowie.
+            # synchronous=OFF tylko na czas naprawy; journal_mode zostaje bez zmian (WAL bota, bez ryzyka utraty kroniki)
+            await db.execute("PRAGMA synchronous=OFF")
+            await db.execute("BEGIN")
             
             # 1. Rename bad table
             logger.info("Renaming current 'subscriptions' to 'subscriptions_backup_corrupted'...")
@@ -50,9 +55,6 @@ async def repair():
             # 3. Try to migrate data
             logger.info("Attempting to recover data from backup...")
             try:
-                async with db.execute("SELECT * FROM subscriptions_backup_corrupted") as cursor:
-                    old_rows = await cursor.fetchall()
-                
                 # Try to find a default channel for the admin
                 async with db.execute("SELECT channel_id FROM channels WHERE owner_id = ? AND type = 'premium' LIMIT 1", (admin_id,)) as cur:
                     chan_row = await cur.fetchone()
@@ -69,28 +71,42 @@ async def repair():
                 
                 logger.info(f"Using default channel_id: {default_channel_id} for recovered subs")
 
-                recovered_count = 0
-                for row in old_rows:
-                    try:
-                        await db.execute("""
-                            INSERT INTO subscriptions 
-                            (user_id, owner_id, channel_id, username, full_name, start_date, end_date, tier, status, created_at)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        """, (
-                            row['user_id'], 
-                            admin_id, 
-                            default_channel_id,
-                            row['username'], 
-                            row['full_name'], 
-                            row['start_date'], 
-                            row['end_date'], 
-                            row['tier'], 
-                            row['status'],
-                            row['created_at']
-                        ))
-                        recovered_count += 1
-                    except Exception as ins_e:
-                        logger.error(f"Failed to recover sub {row['user_id']}: {ins_e}")
+                # Jedno INSERT ... SELECT w SQLite zamiast pobierania wierszy do Pythona i INSERT per wiersz
+                try:
+                    async with db.execute("""
+                        INSERT INTO subscriptions
+                        (user_id, owner_id, channel_id, username, full_name, start_date, end_date, tier, status, created_at)
+                        SELECT user_id, ?, ?, username, full_name, start_date, end_date, tier, status, created_at
+                        FROM subscriptions_backup_corrupted
+                    """, (admin_id, default_channel_id)) as cursor:
+                        recovered_count = cursor.rowcount
+                except Exception as bulk_e:
+                    # Np. duplikat user_id (wszystkie trafiają do jednego kanału) – wiersz po wierszu, żeby wiedzieć które padły
+                    logger.warning(f"Bulk recovery failed ({bulk_e}), falling back to per-row copy")
+                    async with db.execute("SELECT * FROM subscriptions_backup_corrupted") as cursor:
+                        old_rows = await cursor.fetchall()
+                    recovered_count = 0
+                    for row in old_rows:
+                        try:
+                            await db.execute("""
+                                INSERT INTO subscriptions 
+                                (user_id, owner_id, channel_id, username, full_name, start_date, end_date, tier, status, created_at)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            """, (
+                                row['user_id'], 
+                                admin_id, 
+                                default_channel_id,
+                                row['username'], 
+                                row['full_name'], 
+                                row['start_date'], 
+                                row['end_date'], 
+                                row['tier'], 
+                                row['status'],
+                                row['created_at']
+                            ))
+                            recovered_count += 1
+                        except Exception as ins_e:
+                            logger.error(f"Failed to recover sub {row['user_id']}: {ins_e}")
                 
                 logger.info(f"Recovered {recovered_count} subscriptions.")
                 
@@ -98,6 +114,7 @@ async def repair():
                 logger.error(f"Data recovery failed: {e}")
 
             await db.commit()
+            await db.execute("PRAGMA synchronous=NORMAL")
             logger.info("Repair complete.")
 
     except Exception as e:
@@ -1,20 +1,92 @@
 """
 Opcjonalna średnia wyświetleń na post z kanału (ostatnie N postów).
 Bez Telethon/Pyrogram zwracane jest None – Bot API nie udostępnia historii postów kanału.
-Aby włączyć: zainstaluj Telethon, ustaw TELEGRAM_API_ID i TELEGRAM_API_HASH w .env,
-i zaimplementuj get_channel_avg_views_telethon() (get_messages + message.views).
+Aby włączyć: zainstaluj Telethon, ustaw TELEGRAM_API_ID i TELEGRAM_API_HASH w .env
+i raz zaloguj konto użytkownika do sesji _SESSION_NAME (historia kanału nie jest dostępna dla konta bota).
 """
+import asyncio
 import logging
+import time
+from collections import OrderedDict
+from pathlib import Path
 from typing import Optional
 
+from config import settings
+
+try:
+    from telethon import TelegramClient  # opcjonalnie – średnia wyświetleń
+except ImportError:
+    TelegramClient = None
+
 logger = logging.getLogger(__name__)
 
+# Plik sesji (channel_stats.session) w katalogu projektu, niezależnie od katalogu roboczego procesu
+_SESSION_NAME = str(Path(__file__).resolve().parent.parent / "channel_stats")
+
+# Wynik na (channel_id, limit) przez _AVG_VIEWS_TTL s – kolejne rendery statystyk nie robią RPC; LRU do _AVG_VIEWS_MAX
+_AVG_VIEWS_TTL = 300.0
+_AVG_VIEWS_MAX = 1024
+_avg_views_cache: "OrderedDict[tuple[int, int], tuple[float, Optional[int]]]" = OrderedDict()
+
+_client = None
+_client_unauthorized = False  # sesja niezalogowana – nie łączymy się ponownie przy każdym renderze
+_client_lock = asyncio.Lock()
+
+
+async def _get_client():
+    """Jeden klient Telethon na proces (leniwie); None, gdy sesja nie jest zalogowana."""
+    global _client, _client_unauthorized
+    async with _client_lock:
+        if _client is None and not _client_unauthorized:
+            client = TelegramClient(_SESSION_NAME, settings.TELEGRAM_API_ID, settings.TELEGRAM_API_HASH)
+            await client.connect()
+            if not await client.is_user_authorized():
+                logger.warning("Telethon: sesja %s niezalogowana – średnia wyświetleń wyłączona", _SESSION_NAME)
+                await client.disconnect()
+                _client_unauthorized = True
+                return None
+            _client = client
+        return _client
+
+
+async def close_client() -> None:
+    """Rozłączenie klienta Telethon (przy zamykaniu bota); no-op, gdy nie był połączony."""
+    global _client
+    async with _client_lock:
+        if _client is not None:
+            try:
+                await _client.disconnect()
+            except Exception as e:
+                logger.warning("Telethon disconnect: %s", e)
+            _client = None
+
 
 async def get_channel_avg_views(channel_id: int, limit: int = 10) -> Optional[int]:
     """
     Średnia wyświetleń na post z ostatnich do `limit` postów na kanale.
     Zwraca None, jeśli nie skonfigurowano Telethon (Bot API nie ma dostępu do historii kanału).
     """
-    # Opcjonalna integracja Telethon: jeśli w config są API_ID/API_HASH,
-    # można tu wywołać client.get_messages(channel_id, limit=limit) i uśrednić message.views.
-    return None
+    # Bez Telethon / API_ID / API_HASH – od razu None, bez zapisu do cache
+    if TelegramClient is None or not settings.TELEGRAM_API_ID or not settings.TELEGRAM_API_HASH:
+        return None
+    key = (channel_id, limit)
+    hit = _avg_views_cache.get(key)
+    if hit is not None and time.monotonic() - hit[0] < _AVG_VIEWS_TTL:
+        _avg_views_cache.move_to_end(key)
+        return hit[1]
+    try:
+        client = await _get_client()
+        if client is None:
+            return None
+        messages = await client.get_messages(channel_id, limit=limit)
+        views = [m.views for m in messages if m.views is not None]
+        avg = sum(views) // len(views) if views else None
+    except Exception as e:
+        # Błędu nie cache'ujemy – następny render spróbuje ponownie
+        logger.warning("Telethon get_messages %s: %s", channel_id, e)
+        return None
+    _avg_views_cache[key] = (time.monotonic(), avg)
+    _avg_views_cache.move_to_end(key)
+    if len(_avg_views_cache) > _AVG_VIEWS_MAX:
+        _avg_views_cache.popitem(last=False)
+    return avg
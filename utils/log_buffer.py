@@ -3,6 +3,7 @@ Bufor ostatnich logów w pamięci – do podglądu w panelu super-admina (bez ob
 """
 import logging
 from collections import deque
+from itertools import islice
 from threading import Lock
 
 # Ostatnie N linii (np. 100)
@@ -23,10 +24,10 @@ class BufferHandler(logging.Handler):
             self.handleError(record)
 
 
-def get_recent_lines(n: int = 40) -> list[str]:
-    """Zwraca ostatnie n linii z bufora (od najstarszego do najnowszego)."""
+def recent_lines_newest_first(n: int = 40) -> list[str]:
+    """Lista ostatnich n linii od najnowszego – kopiuje pod blokadą tylko n elementów, nie cały bufor."""
     with _lock:
-        return list(_lines)[-n:]
+        return list(islice(reversed(_lines), n))
 
 
 def setup_buffer_handler(logger_name: str = None) -> None:
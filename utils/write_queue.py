@@ -0,0 +1,98 @@
+"""
+Zapisy z LoggingMiddleware (bot_users + user_interaction_logs) zbierane w pamięci i zapisywane paczkami w tle –
+handler nie czeka na 2–3 zapytania do bazy przy każdym update.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+
+from database.models import BotUsersManager, UserInteractionLog
+
+logger = logging.getLogger("write_queue")
+
+# Zapis co _FLUSH_INTERVAL s albo wcześniej, gdy w kolejce jest _FLUSH_MAX_ROWS logów
+_FLUSH_INTERVAL = 0.5
+_FLUSH_MAX_ROWS = 500
+
+# user_id -> (username, full_name); kolejny update tego samego usera przed zapisem nadpisuje poprzedni
+_pending_users: dict[int, tuple[Optional[str], Optional[str]]] = {}
+# (user_id, event_type, content_preview, created_at) – created_at z chwili zdarzenia, nie zapisu
+_pending_logs: list[tuple[int, str, Optional[str], datetime]] = []
+_flush_now = asyncio.Event()
+_flusher_stop = asyncio.Event()
+_flusher_task: Optional[asyncio.Task] = None
+
+
+def enqueue_user(user_id: int, username: Optional[str], full_name: Optional[str]) -> None:
+    """Upsert użytkownika (jak BotUsersManager.upsert_display) przy następnym zapisie paczki."""
+    prev = _pending_users.get(user_id)
+    if prev is not None:
+        # Jak COALESCE w SQL: brak nowej wartości nie kasuje poprzedniej
+        username = username or prev[0]
+        full_name = full_name or prev[1]
+    _pending_users[user_id] = (username, full_name)
+
+
+def enqueue_interaction(user_id: int, event_type: str, content_preview: Optional[str]) -> None:
+    """Log interakcji (jak UserInteractionLog.add) przy następnym zapisie paczki."""
+    _pending_logs.append((user_id, event_type, content_preview, datetime.now()))
+    if len(_pending_logs) >= _FLUSH_MAX_ROWS:
+        _flush_now.set()
+
+
+async def flush_pending_writes() -> None:
+    """Zapis zebranych wierszy; przy błędzie wracają do kolejki (logi – tylko do limitu, żeby nie rosły bez końca)."""
+    global _pending_users, _pending_logs
+    if not _pending_users and not _pending_logs:
+        return
+    users, _pending_users = _pending_users, {}
+    logs, _pending_logs = _pending_logs, []
+    # Obie tabele niezależne (bez klucza obcego) – zapisy równolegle, na Postgresie z dwóch połączeń puli
+    users_ok = logs_ok = False
+    try:
+        users_ok, logs_ok = await asyncio.gather(
+            BotUsersManager.bulk_upsert_display([(u, n, f) for u, (n, f) in users.items()]),
+            UserInteractionLog.bulk_add(logs),
+        )
+    finally:
+        # Także przy wyjątku / anulowaniu w trakcie zapisu – paczki wracają do kolejki zamiast przepaść
+        if not users_ok:
+            for u, vals in users.items():
+                _pending_users.setdefault(u, vals)
+        if not logs_ok:
+            _pending_logs[:0] = logs[-_FLUSH_MAX_ROWS * 10:]
+
+
+async def _write_flusher() -> None:
+    # Pętla kończy się po _flusher_stop (bez cancel) – trwający zapis dobiega końca, potem ostatni flush
+    while not _flusher_stop.is_set():
+        try:
+            await asyncio.wait_for(_flush_now.wait(), timeout=_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _flush_now.clear()
+        try:
+            await flush_pending_writes()
+        except Exception as e:
+            logger.warning("Write flusher: %s", e)
+
+
+def start_write_flusher() -> None:
+    """Start zadania zapisującego paczki w tle (wywoływane przy starcie bota)."""
+    global _flusher_task
+    if _flusher_task is None or _flusher_task.done():
+        _flusher_stop.clear()
+        _flusher_task = asyncio.create_task(_write_flusher())
+
+
+async def stop_write_flusher() -> None:
+    """Zatrzymanie zadania i zapis pozostałych wierszy (przed zamknięciem bazy)."""
+    global _flusher_task
+    if _flusher_task is not None:
+        _flusher_stop.set()
+        _flush_now.set()  # wybudzenie pętli od razu
+        await _flusher_task
+        _flusher_task = None
+    else:
+        await flush_pending_writes()